@@ -14,15 +14,27 @@ Usage:
 import sys
 import os
 import pickle
-import mysql.connector
 from mysql.connector import Error
+from mysql.connector.pooling import MySQLConnectionPool
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 from datetime import datetime
 import urllib.parse
+import re
 import json
 import csv
 import time
-from typing import Dict, List, Set
+import queue
+import socket
+import ssl
+import http.client
+import random
+import functools
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+import httplib2
 from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -38,21 +50,100 @@ COURSE_FAILED_CSV_BACKUP = 'campaign_course_failed_backup.csv'
 AD_SUCCESS_CSV_BACKUP = 'campaign_ad_success_backup.csv'
 AD_FAILED_CSV_BACKUP = 'campaign_ad_failed_backup.csv'
 CAMPAIGN_COUNTER_FILE = 'campaign_counters.json'
+CSV_WRITE_BUFFER = 1 << 20  # 1MB, so a whole batch reaches the CSV backup in a few syscalls
+
+# Pending rows (across all sheets) that trigger a write to Google Sheets mid-run
+SHEETS_WRITE_BATCH_ROWS = 500
+EXISTING_IDS_CACHE_FILE = 'existing_ids_cache.pkl'
+
+# Most rows sent in one values.batchUpdate; larger writes (e.g. a first merge) are split
+SHEETS_MAX_ROWS_PER_REQUEST = 5000
+
+# Extra rows read past the known end of a sheet when merging, in case rows were added by hand
+MERGE_READ_SLACK_ROWS = 100
+
+# Fraction of writes re-read for verification when the updated cell count already matches
+VERIFY_SAMPLE_RATE = float(os.getenv('VERIFY_SAMPLE_RATE', 0.1))
+
+# Sheets API statuses that are permanent, and those that may carry a Retry-After header
+NON_RETRYABLE_HTTP_STATUSES = frozenset({400, 401, 403, 404})
+RETRY_AFTER_HTTP_STATUSES = frozenset({429, 503})
+
+# Transport failures worth retrying; anything else (KeyError, TypeError, file and permission errors, ...)
+# fails fast. socket.timeout and socket.gaierror (DNS) are OSErrors outside ConnectionError; httplib2
+# (the Sheets client's transport) and http.client raise their own errors for dropped or garbled responses.
+RECOVERABLE_ERRORS = (ConnectionError, TimeoutError, socket.timeout, socket.gaierror, ssl.SSLError,
+                      httplib2.HttpLib2Error, http.client.HTTPException)
+
+# Last populated row of column A per (spreadsheet_id, sheet_name), as read (and written) this run;
+# reset at the start of main()
+_sheet_row_counts = {}
+
+# Sheet types whose CSV backup was already started this run
+_backed_up_sheet_types = set()
+
+# Set TRUST_LOCAL_IDS=1 to skip reading a sheet's IDs when the cached IDs match the local counters.
+# Rows added to the sheet by hand are then not seen, and the next write starts below the cached end.
+TRUST_LOCAL_IDS = os.getenv('TRUST_LOCAL_IDS', '0') == '1'
+
+# MySQL connection pool size cap; pools are created per environment on first use
+DB_POOL_SIZE = int(os.getenv('DB_POOL', 8))
+
+# Database worker threads, one per sheet type (course/ad x success/failed)
+DB_WORKERS = 4
+
+# Root log level; set LOG_LEVEL=DEBUG for the per-row debug output
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Background thread writing queued log records; set while logging is set up
+_log_listener = None
 
 # Set up logging
 def setup_logging():
-    """Configure logging for the script"""
+    """Configure logging for the script
+    
+    Log calls (from the main thread and the database workers) only put records on a
+    queue; a background listener thread formats them and writes the file and console.
+    Does nothing if logging is already set up, so several campaigns can run in one process.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler('campaign_tracker.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.Queue(-1)
+    _log_listener = QueueListener(log_queue, *handlers)
+    _log_listener.start()
+    
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('campaign_tracker.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
+        format='%(message)s',  # Timestamp and level are added by the listener's handlers
+        handlers=[QueueHandler(log_queue)],
+        force=True  # Replace the queue handler of a previous, stopped setup
     )
-    # Set logging level to DEBUG to see all messages
-    logging.getLogger().setLevel(logging.DEBUG)
-    logging.info("Logging initialized with DEBUG level")
+    # Defaults to DEBUG to see all messages
+    logging.getLogger().setLevel(LOG_LEVEL)
+    logging.info(f"Logging initialized with {LOG_LEVEL} level")
+
+def stop_logging():
+    """Write out the queued log records, stop the listener thread and close the log file"""
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+    _log_listener = None
+
+# Flush whatever is still queued when the script exits
+atexit.register(stop_logging)
 
 def load_local_counters() -> Dict[str, int]:
     """Load local counters from file."""
@@ -128,67 +219,99 @@ def update_counters_after_processing(counters: Dict[str, int], sheet_type: str,
     logging.info(f"Updated counters: +{new_count} for {sheet_type}")
     return updated_counters
 
-def save_to_csv(data: List[List], filename: str) -> None:
-    """Save data to local CSV file."""
+def save_to_csv(data: List[List], filename: str, mode: str = 'w') -> None:
+    """Save data to local CSV file with one writerows() through a large write buffer."""
     try:
         if len(data) > 0:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerows(data)
+            with open(filename, mode, newline='', encoding='utf-8', buffering=CSV_WRITE_BUFFER) as f:
+                csv.writer(f).writerows(data)
             logging.info(f"Saved {len(data)-1 if len(data) > 1 else 0} records to {filename}")
     except Exception as e:
         logging.error(f"Error saving to CSV {filename}: {e}")
         raise
 
-def verify_write_success(service, spreadsheet_id: str, sheet_name: str, written_data: List[List]) -> bool:
-    """Verify that the records were actually written to the sheet."""
-    try:
-        if len(written_data) <= 0:
-            logging.info("No records to verify")
-            return True
+# Exponential backoff between retries
+def backoff_sleep(attempt: int, base: float = 1.0, cap: float = 30.0, jitter: float = 0.5) -> float:
+    """Sleep before retry number attempt (0-based) using capped exponential backoff with jitter.
+    
+    The random jitter stops parallel campaign runs that hit the Sheets quota together
+    from all retrying in lockstep. Returns the delay slept.
+    """
+    delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(0, jitter))
+    logging.info(f"Retrying in {delay:.1f} seconds...")
+    time.sleep(delay)
+    return delay
+
+# Decide how long to wait after a Sheets API error
+def retry_after_http_error(e: HttpError, attempt: int) -> bool:
+    """Wait before retrying a failed Sheets call; returns False if the error is permanent.
+    
+    400/403/404 will not go away on retry. For 429/503 Google usually sends Retry-After,
+    which is the exact wait until the quota refills, so it is used instead of guessing.
+    """
+    status = getattr(e.resp, 'status', None)
+    if status in NON_RETRYABLE_HTTP_STATUSES:
+        logging.error(f"HTTP {status} is not retryable, giving up")
+        return False
+    retry_after = e.resp.get('retry-after') if status in RETRY_AFTER_HTTP_STATUSES else None
+    if retry_after and str(retry_after).strip().isdigit():
+        logging.info(f"HTTP {status}: retrying after {retry_after} seconds as requested by the server...")
+        time.sleep(int(retry_after))
+    else:
+        backoff_sleep(attempt)
+    return True
+
+def verify_write_success(service, spreadsheet_id: str, payloads: List[Tuple[str, int, List[List]]], retries: int = 3) -> bool:
+    """Verify that the records were actually written by re-reading only the rows just written."""
+    payloads = [(sheet_name, start_row, rows) for sheet_name, start_row, rows in payloads if rows]
+    if not payloads:
+        logging.info("No records to verify")
+        return True
+    
+    # Only column A of the written block of each sheet is needed
+    ranges = [
+        f"{sheet_name}!A{start_row}:A{start_row + len(rows) - 1}"
+        for sheet_name, start_row, rows in payloads
+    ]
+    
+    for attempt in range(retries):
+        try:
+            logging.info(f"Verifying write success by re-reading {', '.join(ranges)}")
             
-        logging.info("Verifying write success by re-reading sheet...")
-        
-        # Wait a moment for API propagation
-        time.sleep(3)
-        
-        # Re-read the sheet
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A:A"
-        ).execute()
-        
-        values = result.get('values', [])
-        
-        current_ids = set()
-        if len(values) > 1:
-            for row in values[1:]:  # Skip header
-                if row and row[0] and str(row[0]).replace('.', '').isdigit():
-                    current_ids.add(int(float(row[0])))
-        
-        verification_failed = False
-        
-        # Check if all written IDs are now in the sheet
-        for row in written_data:
-            if row and len(row) > 0:
-                try:
-                    record_id = int(float(row[0]))
-                    if record_id not in current_ids:
-                        logging.error(f"VERIFICATION FAILED: ID {record_id} not found in sheet after write")
-                        verification_failed = True
-                except (ValueError, IndexError):
-                    continue
-        
-        if not verification_failed:
-            logging.info("Write verification PASSED - all records found in sheet")
-            return True
-        else:
-            logging.error("Write verification FAILED - some records missing from sheet")
-            return False
+            result = service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=ranges,
+                majorDimension='COLUMNS'
+            ).execute()
             
-    except Exception as e:
-        logging.error(f"Write verification error: {e}")
-        return False
+            verification_failed = False
+            
+            for (sheet_name, _, written_data), value_range in zip(payloads, result.get('valueRanges', [])):
+                columns = value_range.get('values', [])
+                
+                current_ids = set(map(parse_sheet_id, columns[0] if columns else []))
+                
+                # Check if all written IDs are now in the sheet
+                for row in written_data:
+                    if row:
+                        record_id = parse_sheet_id(row[0])
+                        if record_id is not None and record_id not in current_ids:
+                            logging.error(f"VERIFICATION FAILED: ID {record_id} not found in {sheet_name} after write")
+                            verification_failed = True
+            
+            if not verification_failed:
+                logging.info("Write verification PASSED - all records found in sheets")
+                return True
+            
+            logging.error(f"Write verification FAILED on attempt {attempt + 1} - some records missing from sheets")
+            
+        except Exception as e:
+            logging.error(f"Write verification error on attempt {attempt + 1}: {e}")
+        
+        if attempt < retries - 1:
+            backoff_sleep(attempt)
+    
+    return False
 
 # Parse and validate command line arguments
 def parse_arguments():
@@ -216,46 +339,72 @@ def parse_arguments():
     logging.info(f"Starting script with campaign: {campaign_name}, environment: {environment}")
     return campaign_name, environment
 
+# Database connection pool
+@functools.lru_cache(maxsize=None)
+def get_connection_pool(environment):
+    """Get (or lazily create) the MySQL connection pool for an environment
+    
+    The pool opens all its connections up front, so it is no bigger than the number of workers.
+    """
+    config = db_config[environment]
+    pool_size = min(DB_POOL_SIZE, DB_WORKERS)
+    logging.info(f"Creating connection pool for {environment} database at {config['host']} (size {pool_size})")
+    return MySQLConnectionPool(
+        pool_name=f"cmp-{environment}",
+        pool_size=pool_size,
+        pool_reset_session=False,
+        use_pure=False,  # C extension: row decoding happens in C
+        host=config['host'],
+        user=config['user'],
+        password=config['password'],
+        database=config['database']
+    )
+
 # Database connection
 def connect_to_database(environment):
-    """Connect to the database based on environment setting"""
+    """Get a pooled database connection based on environment setting
+    
+    Calling close() on the returned connection hands it back to the pool. Runs in the
+    database workers, so failures raise Error for the worker to handle per sheet.
+    """
     try:
-        config = db_config[environment]
-        logging.info(f"Connecting to {environment} database at {config['host']}")
-        
-        connection = mysql.connector.connect(
-            host=config['host'],
-            user=config['user'],
-            password=config['password'],
-            database=config['database']
-        )
+        logging.info(f"Getting connection to {environment} database from pool")
+        connection = get_connection_pool(environment).get_connection()
         
         if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
+            # Unbuffered so iter_query_results can stream rows with fetchmany(), and tuple
+            # rows (no per-row dict) - see QUERY_COLUMNS for the column order
+            cursor = connection.cursor(buffered=False)
             db_info = connection.get_server_info()
             logging.info(f"Connected to MySQL server version {db_info}")
             return connection, cursor
         else:
-            logging.error("Failed to connect to database")
-            print("Failed to connect to database")
-            sys.exit(1)
+            connection.close()
+            raise Error("Failed to connect to database")
             
     except Error as e:
         logging.error(f"Error connecting to MySQL database: {e}")
         print(f"Error connecting to MySQL database: {e}")
-        sys.exit(1)
+        raise
 
 # Google Sheets setup
+@functools.lru_cache(maxsize=1)
 def setup_google_sheets():
-    """Set up Google Sheets API connection"""
+    """Set up Google Sheets API connection (built once per process and reused across campaigns)"""
     try:
         logging.info(f"Setting up Google Sheets API with token file: {TOKEN_FILE}")
         # Get or refresh credentials
         creds = None
+        save_token = False
         if os.path.exists(TOKEN_FILE):
-            logging.info("Found existing token.pickle file")
-            with open(TOKEN_FILE, 'rb') as token:
+            logging.info(f"Found existing {TOKEN_FILE} file")
+            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+        elif os.path.exists(LEGACY_TOKEN_FILE):
+            # One-time migration from the old pickled token so no new OAuth consent is needed
+            logging.info(f"Migrating legacy token from {LEGACY_TOKEN_FILE}")
+            with open(LEGACY_TOKEN_FILE, 'rb') as token:
                 creds = pickle.load(token)
+            save_token = True
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
@@ -265,18 +414,29 @@ def setup_google_sheets():
                 logging.info("Getting new token with OAuth flow")
                 flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
                 creds = flow.run_local_server(port=0)
-            
-            with open(TOKEN_FILE, 'wb') as token:
-                pickle.dump(creds, token)
-                logging.info("Token saved to pickle file")
+            save_token = True
+        
+        if save_token:
+            with open(TOKEN_FILE, 'w') as token:
+                token.write(creds.to_json())
+                logging.info(f"Token saved to {TOKEN_FILE}")
         
-        return build('sheets', 'v4', credentials=creds)
+        # Use the discovery document bundled with the client library instead of fetching it;
+        # it is read from the installed package, so the on-disk discovery cache has nothing to add
+        return build('sheets', 'v4', credentials=creds, static_discovery=True, cache_discovery=False)
         
     except Exception as e:
         logging.error(f"Error setting up Google Sheets API: {e}")
         print(f"Error setting up Google Sheets API: {e}")
         sys.exit(1)
 
+# Query string keys read by extract_utm_parameters, and a single-pass key=value scanner
+_UTM_KEYS = frozenset((
+    'first_page', 'greferrer', 'utm_campaign', 'utm_id', 'utm_source',
+    'utm_medium', 'utm_term', 'utm_content', 'fbclid'
+))
+_QS_RE = re.compile(r'([^&=]+)=([^&]*)')
+
 # URL parameter extraction
 def extract_utm_parameters(url, referal_site=""):
     """Extract UTM parameters and page info from URL"""
@@ -292,28 +452,23 @@ def extract_utm_parameters(url, referal_site=""):
         'fbclid': ''            # Added fbclid
     }
     
-    # Log input values for debugging
-    logging.info(f"extract_utm_parameters called with url={url}, referal_site={referal_site}")
-    
     # Try to extract from URL
     if url:
         try:
-            parsed_url = urllib.parse.urlparse(url)
-            query_params = urllib.parse.parse_qs(parsed_url.query)
+            parsed_url = urllib.parse.urlsplit(url)
+            query = parsed_url.query
             
-            # Log parsed values
-            logging.info(f"Parsed URL: {parsed_url}")
-            logging.info(f"Query params: {query_params}")
-            
-            # Extract each parameter if it exists
-            for key in params.keys():
-                if key in query_params and query_params[key]:
-                    params[key] = query_params[key][0]
-            
-            # Special handling for greferrer which is often in the URL params
-            if 'greferrer' in query_params and query_params['greferrer']:
-                params['greferrer'] = query_params['greferrer'][0]
-                logging.info(f"Found greferrer in URL params: {params['greferrer']}")
+            # Scan the query string once, keeping the first non-empty value of each wanted key
+            # (greferrer included - it is often carried in the URL params).
+            # Many URLs carry no query at all, so skip the scan for those.
+            if query:
+                unquote = urllib.parse.unquote_plus
+                for match in _QS_RE.finditer(query):
+                    key = match.group(1)
+                    if '%' in key or '+' in key:
+                        key = unquote(key)
+                    if key in _UTM_KEYS and not params[key]:
+                        params[key] = unquote(match.group(2))
                     
             # Extract first_page if not in query params but in URL path
             if not params['first_page'] and parsed_url.path:
@@ -325,13 +480,33 @@ def extract_utm_parameters(url, referal_site=""):
     # Use referal_site as greferrer if not found in URL
     if not params['greferrer'] and referal_site:
         params['greferrer'] = referal_site
-        logging.info(f"Used referal_site as greferrer: {params['greferrer']}")
-    
-    # Log final parameters
-    logging.info(f"Extracted parameters: {params}")
         
     return params
 
+def _no_landing_page_match(page):
+    """Matcher used when a campaign has no landing pages"""
+    return None
+
+@functools.lru_cache(maxsize=None)
+def _compile_landing_page_matcher(landing_pages_tuple):
+    """Compile the landing pages into a single alternation regex search function"""
+    if not landing_pages_tuple:
+        return _no_landing_page_match
+    return re.compile('|'.join(map(re.escape, landing_pages_tuple))).search
+
+def get_landing_page_matcher(landing_pages_list):
+    """Get a search function matching any of the landing pages as a substring
+    
+    All pages are compiled into a single alternation regex once per list, so a
+    page string is scanned once instead of once per landing page.
+    """
+    return _compile_landing_page_matcher(tuple(landing_pages_list))
+
+@functools.lru_cache(maxsize=None)
+def get_campaign_landing_pages(campaign):
+    """Get the configured landing pages of a campaign as a tuple"""
+    return tuple(landing_pages.get(campaign, []))
+
 # Registration type determination
 def determine_reg_type(first_page, last_page, landing_pages_list):
     """Determine registration type based on first and last pages"""
@@ -340,27 +515,20 @@ def determine_reg_type(first_page, last_page, landing_pages_list):
         first_page_str = str(first_page) if first_page is not None else ""
         last_page_str = str(last_page) if last_page is not None else ""
         
-        # Log inputs for debugging
-        logging.info(f"determine_reg_type called with: first_page={first_page_str}, last_page={last_page_str}")
-        logging.info(f"landing_pages_list={landing_pages_list}")
+        # Check both pages against all landing pages in one pass each
+        search = get_landing_page_matcher(landing_pages_list)
+        first_hit = search(first_page_str)
+        last_hit = search(last_page_str)
+        first_match = first_hit is not None
+        last_match = last_hit is not None
         
-        # Initialize match flags
-        first_match = False
-        last_match = False
-        
-        # Check matches for first_page
-        for lp in landing_pages_list:
-            if lp in first_page_str:
-                first_match = True
-                logging.info(f"First page matched landing page: {lp}")
-                break
-                
-        # Check matches for last_page
-        for lp in landing_pages_list:
-            if lp in last_page_str:
-                last_match = True
-                logging.info(f"Last page matched landing page: {lp}")
-                break
+        # Called once per row, so only build debug output when it will be emitted
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                "determine_reg_type: first_page=%s (match=%s), last_page=%s (match=%s)",
+                first_page_str, first_hit.group(0) if first_match else None,
+                last_page_str, last_hit.group(0) if last_match else None
+            )
         
         # Determine registration type
         if first_page_str == last_page_str and first_match:
@@ -377,58 +545,235 @@ def determine_reg_type(first_page, last_page, landing_pages_list):
         logging.error(f"Types - first_page: {type(first_page)}, last_page: {type(last_page)}")
         return "Error"
 
-# Get existing IDs from sheet with robust error handling
-def get_existing_sheet_ids(sheets_service, spreadsheet_id, sheet_name, retries: int = 3):
-    """Get existing IDs from a sheet to avoid duplicates with retry logic"""
-    existing_ids = set()
+def load_existing_ids_cache() -> Dict[str, Dict]:
+    """Load the on-disk cache of sheet IDs, keyed by 'spreadsheet_id:sheet_name'."""
+    try:
+        if os.path.exists(EXISTING_IDS_CACHE_FILE):
+            with open(EXISTING_IDS_CACHE_FILE, 'rb') as f:
+                return pickle.load(f)
+    except Exception as e:
+        logging.error(f"Error loading existing IDs cache: {e}")
+    return {}
+
+def save_existing_ids_cache(cache: Dict[str, Dict]) -> None:
+    """Save the on-disk cache of sheet IDs."""
+    try:
+        with open(EXISTING_IDS_CACHE_FILE, 'wb') as f:
+            pickle.dump(cache, f)
+    except Exception as e:
+        logging.error(f"Error saving existing IDs cache: {e}")
+
+# A Ref cell holding an integer ID, optionally rendered with a zero fraction ('123.0')
+_SHEET_ID_MATCH = re.compile(r'^\s*(\d+)(?:\.0+)?\s*$').match
+
+def parse_sheet_id(value):
+    """Convert a Ref cell (e.g. '123' or '123.0') to an integer ID, or None if it is not numeric"""
+    match = _SHEET_ID_MATCH(value if isinstance(value, str) else str(value))
+    return int(match.group(1)) if match else None
+
+def read_id_columns(sheets_service, spreadsheet_id, start_rows: Dict[str, int]) -> Dict[str, List[List]]:
+    """Read column A of several sheets in a single batchGet
+    
+    start_rows maps each sheet name to the first row to read; every range runs
+    down to the last populated row.
+    """
+    sheet_names = list(start_rows)
+    result = sheets_service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[f"{sheet_name}!A{start_rows[sheet_name]}:A" for sheet_name in sheet_names]
+    ).execute()
+    value_ranges = result.get('valueRanges', [])
+    return {
+        sheet_name: value_range.get('values', [])
+        for sheet_name, value_range in zip(sheet_names, value_ranges)
+    }
+
+def collect_sheet_ids(spreadsheet_id, sheet_name, values, cached, cache) -> Set[int]:
+    """Parse the column A values read for one sheet and refresh its cache entry"""
+    # The first row read is the header on a full read, or the already-cached anchor row
+    start_row = cached['count'] if cached else 1
+    existing_ids = set(cached['ids']) if cached else set()
+    logging.info(f"Read {max(len(values) - 1, 0)} new rows from {sheet_name} starting after row {start_row}")
+    
+    # Convert the whole column in one pass, then report anything non-numeric after the fact
+    cells = [row[0] if row else '' for row in values[1:]]
+    parsed_ids = list(map(parse_sheet_id, cells))
+    existing_ids.update(record_id for record_id in parsed_ids if record_id is not None)
+    if None in parsed_ids:
+        for i, (cell, record_id) in enumerate(zip(cells, parsed_ids), start=start_row + 1):
+            if record_id is None and cell:
+                logging.warning(f"Non-numeric ID found in {sheet_name} row {i}: '{cell}'")
+    
+    # Remember where the data ends so the next run only reads rows below this one
+    total_rows = start_row - 1 + len(values)
+    _sheet_row_counts[(spreadsheet_id, sheet_name)] = total_rows
+    if total_rows > 0:
+        cache[f"{spreadsheet_id}:{sheet_name}"] = {
+            'count': total_rows,
+            'last_value': str(values[-1][0]) if values[-1] else '',
+            'ids': list(existing_ids)
+        }
+    
+    logging.info(f"Successfully extracted {len(existing_ids)} IDs from {sheet_name}")
+    return existing_ids
+
+# Get existing IDs from sheets with robust error handling
+def get_existing_sheet_ids(sheets_service, spreadsheet_id, sheet_names: List[str], retries: int = 3) -> Dict[str, Set[int]]:
+    """Get existing IDs from several sheets to avoid duplicates, with retry logic
+    
+    All sheets are read with one batchGet. IDs are cached on disk per sheet, so
+    only rows appended since the last run are downloaded. The last cached row is
+    re-read as an anchor; if it no longer matches (rows deleted or re-sorted) that
+    sheet's full column is read again. If the batched read keeps failing (e.g. one
+    sheet is missing), each sheet is retried on its own.
+    """
+    existing_ids_by_sheet = {sheet_name: set() for sheet_name in sheet_names}
+    cache = load_existing_ids_cache()
+    cached_by_sheet = {sheet_name: cache.get(f"{spreadsheet_id}:{sheet_name}") for sheet_name in sheet_names}
+    sheets_label = ', '.join(sheet_names)
     
     for attempt in range(retries):
         try:
-            logging.info(f"Attempt {attempt + 1}/{retries} to read existing IDs from {sheet_name}")
-            result = sheets_service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id, 
-                range=f"{sheet_name}!A:A"
-            ).execute()
+            logging.info(f"Attempt {attempt + 1}/{retries} to read existing IDs from {sheets_label}")
             
-            values = result.get('values', [])
+            # Incremental read for cached sheets, full read for the rest - all in one request
+            values_by_sheet = read_id_columns(sheets_service, spreadsheet_id, {
+                sheet_name: cached['count'] if cached else 1
+                for sheet_name, cached in cached_by_sheet.items()
+            })
             
-            # Always assume the first row is a header and skip it
-            if values and len(values) > 0:
-                values.pop(0)
+            # Sheets whose anchor row changed are re-read in full (again in one request)
+            stale_sheets = []
+            for sheet_name, cached in cached_by_sheet.items():
+                if cached:
+                    values = values_by_sheet.get(sheet_name, [])
+                    anchor = str(values[0][0]) if values and values[0] else ''
+                    if anchor != cached['last_value']:
+                        logging.warning(f"Cached IDs for {sheet_name} no longer match the sheet, re-reading full column")
+                        stale_sheets.append(sheet_name)
+            if stale_sheets:
+                for sheet_name in stale_sheets:
+                    cached_by_sheet[sheet_name] = None
+                values_by_sheet.update(read_id_columns(
+                    sheets_service, spreadsheet_id, {sheet_name: 1 for sheet_name in stale_sheets}
+                ))
             
-            # Extract and convert to numeric
-            if values:
-                for i, row in enumerate(values, start=2):  # Start from row 2 after header
-                    if row and row[0]:  # Make sure there's a value
-                        try:
-                            if str(row[0]).strip().replace('.', '').isdigit():
-                                existing_ids.add(int(float(row[0])))
-                            else:
-                                logging.warning(f"Non-numeric ID found in {sheet_name} row {i}: '{row[0]}'")
-                        except (ValueError, TypeError, IndexError) as e:
-                            logging.warning(f"Error processing {sheet_name} row {i}: {e}")
+            for sheet_name in sheet_names:
+                existing_ids_by_sheet[sheet_name] = collect_sheet_ids(
+                    spreadsheet_id, sheet_name, values_by_sheet.get(sheet_name, []),
+                    cached_by_sheet[sheet_name], cache
+                )
+            save_existing_ids_cache(cache)
             
-            logging.info(f"Successfully extracted {len(existing_ids)} IDs from {sheet_name}")
-            return existing_ids
+            return existing_ids_by_sheet
             
         except HttpError as e:
-            logging.error(f"Google Sheets API error on attempt {attempt + 1} for {sheet_name}: {e}")
+            logging.error(f"Google Sheets API error on attempt {attempt + 1} for {sheets_label}: {e}")
             if attempt < retries - 1:
-                logging.info(f"Retrying in {2 ** attempt} seconds...")
-                time.sleep(2 ** attempt)
+                if not retry_after_http_error(e, attempt):
+                    break
             else:
-                logging.error(f"All retry attempts failed for {sheet_name}")
+                logging.error(f"All retry attempts failed for {sheets_label}")
                 
-        except Exception as e:
-            logging.error(f"Unexpected error on attempt {attempt + 1} for {sheet_name}: {e}")
+        except RECOVERABLE_ERRORS as e:
+            logging.error(f"Network error on attempt {attempt + 1} for {sheets_label}: {e}")
             if attempt < retries - 1:
-                time.sleep(2 ** attempt)
+                backoff_sleep(attempt)
+                
+        except Exception as e:
+            logging.error(f"Unrecoverable error reading IDs from {sheets_label}, not retrying: {e}")
+            break
     
-    return existing_ids
+    # One bad sheet fails the whole batch, so give the others a chance on their own
+    if len(sheet_names) > 1:
+        logging.warning("Batched read of existing IDs failed - reading sheets one at a time")
+        for sheet_name in sheet_names:
+            existing_ids_by_sheet.update(get_existing_sheet_ids(sheets_service, spreadsheet_id, [sheet_name], retries))
+    
+    return existing_ids_by_sheet
+
+# Use cached IDs instead of reading sheets whose cache agrees with the local counters
+def get_trusted_cached_ids(spreadsheet_id, sheet_targets, counters, campaign) -> Dict[str, Set[int]]:
+    """Return cached IDs of the sheets that need no read this run (only when TRUST_LOCAL_IDS is set)"""
+    if not TRUST_LOCAL_IDS or counters.get('campaign') != campaign:
+        return {}
+    cache = load_existing_ids_cache()
+    trusted = {}
+    for _, _, sheet_type, sheet_name in sheet_targets:
+        cached = cache.get(f"{spreadsheet_id}:{sheet_name}")
+        if cached and len(cached['ids']) == counters.get(f'{sheet_type}_count', 0):
+            trusted[sheet_name] = set(cached['ids'])
+            _sheet_row_counts[(spreadsheet_id, sheet_name)] = cached['count']
+            logging.info(f"Using {len(cached['ids'])} cached IDs for {sheet_name} - matches local counters, skipping read")
+    return trusted
+
+# Keep the IDs cache in step with rows written this run
+def record_written_ids(spreadsheet_id, written) -> None:
+    """Add the IDs of rows just written to the on-disk cache, so the next run reads from their end"""
+    cache = load_existing_ids_cache()
+    for sheet_name in {sheet_name for _, sheet_name, _ in written}:
+        cached = cache.get(f"{spreadsheet_id}:{sheet_name}")
+        if not cached:
+            # Nothing cached to extend - the next run reads this sheet in full
+            continue
+        ids = set(cached['ids'])
+        last_value = cached['last_value']
+        for _, name, data in written:
+            if name == sheet_name:
+                ids.update(record_id for record_id in map(parse_sheet_id, (row[0] for row in data if row)) if record_id is not None)
+                last_value = str(data[-1][0]) if data[-1] else ''
+        cache[f"{spreadsheet_id}:{sheet_name}"] = {
+            'count': _sheet_row_counts[(spreadsheet_id, sheet_name)],
+            'last_value': last_value,
+            'ids': list(ids)
+        }
+    save_existing_ids_cache(cache)
+
+def get_next_sheet_row(spreadsheet_id, sheet_name):
+    """Get the first empty row below the IDs read this run, or None if the sheet was not read"""
+    row_count = _sheet_row_counts.get((spreadsheet_id, sheet_name))
+    if row_count is None:
+        return None
+    # Row 1 is always the header
+    return max(row_count + 1, 2)
+
+# Rows per INSERT statement when loading existing IDs into the temp table
+SEEN_IDS_INSERT_CHUNK = 5000
+
+# Load existing sheet IDs into a session temp table for anti-join filtering
+def load_existing_into_temp(cursor, existing_ids):
+    """Load IDs already present in the sheet into the _seen_ids temp table
+    
+    The query builders LEFT JOIN against this table instead of inlining a
+    NOT IN (...) list, so must be called before each query is executed.
+    """
+    cursor.execute(
+        "CREATE TEMPORARY TABLE IF NOT EXISTS _seen_ids (id BIGINT PRIMARY KEY) ENGINE=MEMORY"
+    )
+    # Pooled connections keep their session, so clear anything from a previous sheet
+    cursor.execute("TRUNCATE TABLE _seen_ids")
+    
+    if not existing_ids:
+        logging.info("No existing IDs to load into temp table")
+        return
+    
+    # executemany() sends each chunk as one multi-row INSERT (the connector only does this
+    # for plain INSERT INTO ... VALUES, hence no IGNORE - the IDs come from a set anyway)
+    ids = [(record_id,) for record_id in existing_ids]
+    cursor.execute("START TRANSACTION")
+    for start in range(0, len(ids), SEEN_IDS_INSERT_CHUNK):
+        cursor.executemany(
+            "INSERT INTO _seen_ids (id) VALUES (%s)",
+            ids[start:start + SEEN_IDS_INSERT_CHUNK]
+        )
+    cursor.execute("COMMIT")
+    
+    logging.info(f"Loaded {len(ids)} existing IDs into temp table")
 
 # Build query for course-based data
-def build_course_query(campaign, status_type, existing_ids):
-    """Build SQL query for course-based data"""
+@functools.lru_cache(maxsize=None)
+def build_course_query(campaign, status_type):
+    """Build SQL query for course-based data (built once per campaign and status; IDs come from _seen_ids)"""
     where_clauses = []
     
     # Add course types filter
@@ -443,11 +788,8 @@ def build_course_query(campaign, status_type, existing_ids):
         where_clauses.append(f"cpd.`entity_id` IN ({course_id_str})")
         logging.info(f"Added course ID filter with {len(course_ids[campaign])} IDs")
     
-    # Add existing IDs filter to avoid duplicates
-    if existing_ids:
-        existing_ids_str = ','.join(map(str, existing_ids))
-        where_clauses.append(f"(cpd.`id` NOT IN ({existing_ids_str}))")
-        logging.info(f"Added existing IDs filter with {len(existing_ids)} IDs")
+    # Skip IDs already in the sheet (anti-join against the _seen_ids temp table)
+    where_clauses.append("s.`id` IS NULL")
     
     # Add date filter if applicable
     if campaign in date_filters:
@@ -499,6 +841,8 @@ def build_course_query(campaign, status_type, existing_ids):
         `civicrm_value_private_event_information_33` pei ON pei.`entity_id` = ce.`id`
     INNER JOIN 
         `payment_transactions` pt ON pt.`participant_id` = cpd.`id`
+    LEFT JOIN 
+        `_seen_ids` s ON s.`id` = cpd.`id`
     WHERE {where_condition}
     GROUP BY cpd.`id`
     ORDER BY `submitted_on` ASC
@@ -511,8 +855,9 @@ def build_course_query(campaign, status_type, existing_ids):
     return sql
 
 # Build query for landing page-based data
-def build_landing_page_query(campaign, status_type, existing_ids):
-    """Build SQL query for landing page-based data"""
+@functools.lru_cache(maxsize=None)
+def build_landing_page_query(campaign, status_type):
+    """Build SQL query for landing page-based data (built once per campaign and status; IDs come from _seen_ids)"""
     where_clauses = []
     
     # Add landing page filter - we need OR conditions for each landing page
@@ -528,11 +873,8 @@ def build_landing_page_query(campaign, status_type, existing_ids):
         where_clauses.append(landing_page_filter)
         logging.info(f"Added landing page filter with {len(landing_pages[campaign])} pages and {len(landing_page_conditions)} conditions")
     
-    # Add existing IDs filter to avoid duplicates
-    if existing_ids:
-        existing_ids_str = ','.join(map(str, existing_ids))
-        where_clauses.append(f"(cpd.`id` NOT IN ({existing_ids_str}))")
-        logging.info(f"Added existing IDs filter with {len(existing_ids)} IDs")
+    # Skip IDs already in the sheet (anti-join against the _seen_ids temp table)
+    where_clauses.append("s.`id` IS NULL")
     
     # Add date filter if applicable
     if campaign in date_filters:
@@ -579,6 +921,8 @@ def build_landing_page_query(campaign, status_type, existing_ids):
         `civicrm_value_private_event_information_33` pei ON pei.`entity_id` = ce.`id`
     INNER JOIN 
         `payment_transactions` pt ON pt.`participant_id` = cpd.`id`
+    LEFT JOIN 
+        `_seen_ids` s ON s.`id` = cpd.`id`
     WHERE {where_condition}
     GROUP BY cpd.`id`
     ORDER BY `submitted_on` ASC
@@ -590,9 +934,26 @@ def build_landing_page_query(campaign, status_type, existing_ids):
     
     return sql
 
+# Rows pulled from the server per round-trip when streaming results; each fetched
+# chunk is formatted and handed to the caller as one batch
+FETCH_BATCH_SIZE = 500
+
+# Columns selected by build_course_query / build_landing_page_query, in SELECT order.
+# Rows come back as plain tuples, so keep this in sync with both queries.
+QUERY_COLUMNS = (
+    'id', 'entity_id', 'event_type_id', 'eid', 'title', 'accounting_course_id_201',
+    'name', 'participant_email', 'participant_phone', 'pincode', 'submitted_on',
+    'referal_site', 'reg_utm_url', 'pg_res_msg', 'pg_res_code', 'ptid'
+)
+
 # Process query results
-def process_query_results(cursor, campaign, status_type, sheet_type, sql):
-    """Process database query results and format for Google Sheets"""
+def iter_query_results(cursor, campaign, status_type, sheet_type, sql):
+    """Process database query results and yield them formatted for Google Sheets
+
+    Rows are streamed from the server in chunks of FETCH_BATCH_SIZE and each chunk
+    is yielded as soon as it is formatted, so memory stays bounded on large result
+    sets and the caller can write to Sheets while the query is still being read.
+    """
     try:
         logging.info(f"Executing SQL query for {sheet_type} {status_type}")
         cursor.execute(sql)
@@ -603,221 +964,450 @@ def process_query_results(cursor, campaign, status_type, sheet_type, sql):
             last_executed_query = last_executed_query.decode('utf-8')
         logging.info(f"Actual executed query: {last_executed_query}")
         
-        rows = cursor.fetchall()
+        # Totals for the final summary
+        total_rows = 0
         
-        if not rows:
-            logging.warning(f"No data found for {sheet_type} {status_type}.")
-            return []
+        # Get the landing pages for this campaign - ensure we're getting the right config
+        campaign_landing_pages = get_campaign_landing_pages(campaign)
+        logging.info(f"Campaign {campaign} landing pages: {campaign_landing_pages}")
         
-        logging.info(f"Query returned {len(rows)} rows")
+        # Status text only depends on the status type, except for failed payments with a gateway message
+        base_status_text = "Success" if status_type == "success" else "Failed"
+        is_failed = status_type == "failed"
         
-        # Alert if processing unusually large batch
-        if len(rows) > 100:  # Adjust threshold as needed
-            logging.warning(f"ALERT: Processing unusually large batch of {len(rows)} records - this may indicate an issue")
+        # Bind hot-path callables and config lookups to locals once
+        extract = extract_utm_parameters
+        determine = determine_reg_type
+        pg_status_lookup = juspay_status.get
         
-        # Process results and prepare data for Google Sheets
-        data = []
+        # Rows from the same ad/landing page share URLs, so parse and classify
+        # each distinct (reg_utm_url, referal_site) pair only once per result set
+        parsed_cache = {}
+        cache_lookup = parsed_cache.get
+        debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
         
-        # Get the landing pages for this campaign - ensure we're getting the right config
-        campaign_landing_pages = landing_pages.get(campaign, [])
-        logging.info(f"Campaign {campaign} landing pages: {campaign_landing_pages}")
-        
-        for row_index, row in enumerate(rows):
-            logging.info(f"Processing row {row_index + 1} of {len(rows)}")
-            
-            # Ensure values are not None and convert phone to string immediately
-            row['participant_email'] = row['participant_email'] or ""
-            row['participant_phone'] = str(row['participant_phone']) if row['participant_phone'] else ""
-            row['name'] = row['name'] or ""
-            row['pincode'] = row['pincode'] or ""
-            row['referal_site'] = row['referal_site'] or ""
-            row['reg_utm_url'] = row['reg_utm_url'] or ""
+        row_index = 0
+        while True:
+            chunk = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not chunk:
+                break
             
-            # Log row values for debugging
-            logging.info(f"Row data - reg_utm_url: {row['reg_utm_url']}, referal_site: {row['referal_site']}")
+            # Process results and prepare data for Google Sheets
+            data = []
+            append = data.append
             
-            try:
-                # Extract UTM parameters and first/last page
-                utm_params = extract_utm_parameters(row['reg_utm_url'], row['referal_site'])
+            for row in chunk:
+                row_index += 1
                 
-                # Get status text
-                status_text = "Success" if status_type == "success" else "Failed"
-                if status_type == "failed" and row['pg_res_msg']:
-                    pg_status = juspay_status.get(row['pg_res_code'], '')
-                    status_text = f"Failed: {row['pg_res_msg']} ({pg_status})"
+                # Plain tuple rows, unpacked in QUERY_COLUMNS order
+                (record_id, _, _, _, title, course_id, name, email, phone, _,
+                 submitted_on, referal_site, reg_utm_url, pg_res_msg, pg_res_code, _) = row
                 
-                # Determine registration type
-                reg_type = determine_reg_type(
-                    utm_params['first_page'], 
-                    utm_params['greferrer'], 
-                    campaign_landing_pages  # Use the landing pages we verified
-                )
+                # Ensure values are not None and convert phone to string immediately
+                email = email or ""
+                phone = str(phone) if phone else ""
+                name = name or ""
+                referal_site = referal_site or ""
+                reg_utm_url = reg_utm_url or ""
                 
-                # Format data for Google Sheets
-                formatted_row = [
-                    row['id'],                      # Ref
-                    row['accounting_course_id_201'],# Course ID
-                    row['title'],                   # Course name
-                    row['name'],                    # Name
-                    row['participant_email'],       # Email
-                    row['participant_phone'],       # Phone - now already a string
-                    str(row['submitted_on']),       # Submitted on
-                    status_text,                    # Status
-                    row['referal_site'],            # referal_site
-                    row['reg_utm_url'],             # reg_utm_url
-                    utm_params['first_page'],       # first_page
-                    utm_params['greferrer'],        # last_page(greferrer)
-                    utm_params['utm_campaign'],     # utm_campaign
-                    utm_params['utm_id'],           # utm_id
-                    utm_params['utm_source'],       # utm_source
-                    utm_params['utm_medium'],       # utm_medium
-                    utm_params['utm_term'],         # utm_term
-                    utm_params['utm_content'],      # utm_content
-                    utm_params['fbclid'],           # fbclid
-                    reg_type                        # reg_type
-                ]
-                
-                data.append(formatted_row)
-                logging.info(f"Successfully processed row {row_index + 1}")
-                
-            except Exception as e:
-                logging.error(f"Error processing row {row_index + 1}: {e}")
-                logging.error(f"Row data that caused error: {row}")
-                # Use a fallback approach for this row
-                formatted_row = [
-                    row['id'],                      # Ref
-                    row['accounting_course_id_201'],# Course ID
-                    row['title'],                   # Course name
-                    row['name'],                    # Name
-                    row['participant_email'],       # Email
-                    str(row['participant_phone']) if row['participant_phone'] else "",  # Phone - convert to string
-                    str(row['submitted_on']),       # Submitted on
-                    "Error",                        # Status
-                    row['referal_site'],            # referal_site
-                    row['reg_utm_url'],             # reg_utm_url
-                    "",                             # first_page
-                    row['referal_site'],            # last_page(greferrer)
-                    "",                             # utm_campaign
-                    "",                             # utm_id
-                    "",                             # utm_source
-                    "",                             # utm_medium
-                    "",                             # utm_term
-                    "",                             # utm_content
-                    "",                             # fbclid
-                    "Error"                         # reg_type
-                ]
-                data.append(formatted_row)
+                try:
+                    cache_key = (reg_utm_url, referal_site)
+                    cached = cache_lookup(cache_key)
+                    if cached is None:
+                        # Extract UTM parameters and first/last page
+                        utm_params = extract(reg_utm_url, referal_site)
+                        
+                        # Determine registration type
+                        reg_type = determine(
+                            utm_params['first_page'], 
+                            utm_params['greferrer'], 
+                            campaign_landing_pages  # Use the landing pages we verified
+                        )
+                        parsed_cache[cache_key] = (utm_params, reg_type)
+                    else:
+                        utm_params, reg_type = cached
+                    
+                    # Get status text
+                    status_text = base_status_text
+                    if is_failed and pg_res_msg:
+                        pg_status = pg_status_lookup(pg_res_code, '')
+                        status_text = f"Failed: {pg_res_msg} ({pg_status})"
+                    
+                    # Format data for Google Sheets
+                    append([
+                        record_id,                      # Ref
+                        course_id,                      # Course ID
+                        title,                          # Course name
+                        name,                           # Name
+                        email,                          # Email
+                        phone,                          # Phone - now already a string
+                        str(submitted_on),              # Submitted on
+                        status_text,                    # Status
+                        referal_site,                   # referal_site
+                        reg_utm_url,                    # reg_utm_url
+                        utm_params['first_page'],       # first_page
+                        utm_params['greferrer'],        # last_page(greferrer)
+                        utm_params['utm_campaign'],     # utm_campaign
+                        utm_params['utm_id'],           # utm_id
+                        utm_params['utm_source'],       # utm_source
+                        utm_params['utm_medium'],       # utm_medium
+                        utm_params['utm_term'],         # utm_term
+                        utm_params['utm_content'],      # utm_content
+                        utm_params['fbclid'],           # fbclid
+                        reg_type                        # reg_type
+                    ])
+                    
+                    if debug_enabled:
+                        logging.debug("Processed row %s (id=%s, reg_type=%s)", row_index, record_id, reg_type)
+                    
+                except Exception as e:
+                    logging.error(f"Error processing row {row_index}: {e}")
+                    logging.error(f"Row data that caused error: {dict(zip(QUERY_COLUMNS, row))}")
+                    # Use a fallback approach for this row
+                    append([
+                        record_id,                      # Ref
+                        course_id,                      # Course ID
+                        title,                          # Course name
+                        name,                           # Name
+                        email,                          # Email
+                        phone,                          # Phone - already a string
+                        str(submitted_on),              # Submitted on
+                        "Error",                        # Status
+                        referal_site,                   # referal_site
+                        reg_utm_url,                    # reg_utm_url
+                        "",                             # first_page
+                        referal_site,                   # last_page(greferrer)
+                        "",                             # utm_campaign
+                        "",                             # utm_id
+                        "",                             # utm_source
+                        "",                             # utm_medium
+                        "",                             # utm_term
+                        "",                             # utm_content
+                        "",                             # fbclid
+                        "Error"                         # reg_type
+                    ])
         
-        return data
+            total_rows += len(data)
+            yield data
+        
+        if not total_rows:
+            logging.warning(f"No data found for {sheet_type} {status_type}.")
+            return
+        
+        logging.info(f"Query returned {total_rows} rows ({len(parsed_cache)} distinct URLs parsed)")
+        
+        # Alert if processing unusually large batch
+        if total_rows > 100:  # Adjust threshold as needed
+            logging.warning(f"ALERT: Processed unusually large batch of {total_rows} records - this may indicate an issue")
         
     except Error as e:
         logging.error(f"Error executing SQL query: {e}")
         print(f"Error executing SQL query: {e}")
-        return []
 
-def write_to_google_sheets_robust(service, spreadsheet_id: str, sheet_name: str, data: List[List], retries: int = 3) -> bool:
-    """Write data to Google Sheets with enhanced error handling and verification."""
-    if not data or len(data) == 0:
-        logging.info(f"No data to write to {sheet_name}")
-        return True
+# Split a large write into several requests
+def split_payloads(payloads: List[Tuple[str, int, List[List]]], max_rows: int) -> List[List[Tuple[str, int, List[List]]]]:
+    """Split (sheet_name, start_row, rows) payloads into groups of at most max_rows rows in total"""
+    chunks = []
+    current = []
+    current_rows = 0
+    for sheet_name, start_row, rows in payloads:
+        offset = 0
+        while offset < len(rows):
+            take = min(max_rows - current_rows, len(rows) - offset)
+            current.append((sheet_name, start_row + offset, rows[offset:offset + take]))
+            current_rows += take
+            offset += take
+            if current_rows == max_rows:
+                chunks.append(current)
+                current = []
+                current_rows = 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+# Write one request's worth of rows
+def write_payload_chunk(service, spreadsheet_id: str, payloads: List[Tuple[str, int, List[List]]], retries: int = 3) -> bool:
+    """Write (sheet_name, start_row, rows) payloads with a single values.batchUpdate, retrying and verifying"""
+    sheet_names = ', '.join(sheet_name for sheet_name, _, _ in payloads)
+    total_rows = sum(len(rows) for _, _, rows in payloads)
+    # None cells are skipped by the API and not counted in totalUpdatedCells
+    expected_cells = sum(cell is not None for _, _, rows in payloads for row in rows for cell in row)
         
     for attempt in range(retries):
         try:
-            logging.info(f"Attempt {attempt + 1}/{retries} to write {len(data)} rows to {sheet_name}")
+            logging.info(f"Attempt {attempt + 1}/{retries} to write {total_rows} rows to {sheet_names}")
             
-            body = {'values': data}
+            body = {
+                # RAW skips server-side parsing; phones are already str, so they stay text with their
+                # leading + or 0 intact (an apostrophe prefix would be stored literally under RAW)
+                'valueInputOption': 'RAW',
+                'data': [
+                    {'range': f"{sheet_name}!A{start_row}", 'values': rows}
+                    for sheet_name, start_row, rows in payloads
+                ]
+            }
             
-            result = service.spreadsheets().values().append(
+            result = service.spreadsheets().values().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!A2",  # Start from row 2 to preserve header
-                valueInputOption='USER_ENTERED',  # Changed from 'RAW' to handle phone numbers better
-                insertDataOption='INSERT_ROWS',
                 body=body
             ).execute()
             
-            updated_cells = result.get('updates', {}).get('updatedCells', 0)
-            logging.info(f"Google Sheets API response for {sheet_name}: updatedCells={updated_cells}")
+            updated_cells = result.get('totalUpdatedCells', 0)
+            logging.info(f"Google Sheets API response for {sheet_names}: updatedCells={updated_cells}")
             
-            # Verify the write was successful
-            verification_passed = verify_write_success(service, spreadsheet_id, sheet_name, data)
+            # The response already reports how many cells landed; re-read the sheets only when
+            # that count is off, or for a random sample of writes
+            if updated_cells != expected_cells:
+                logging.warning(f"Expected {expected_cells} updated cells for {sheet_names}, got {updated_cells} - verifying")
+                verification_passed = verify_write_success(service, spreadsheet_id, payloads)
+            elif random.random() < VERIFY_SAMPLE_RATE:
+                verification_passed = verify_write_success(service, spreadsheet_id, payloads)
+            else:
+                verification_passed = True
             if not verification_passed:
-                logging.error(f"CRITICAL: Write verification failed for {sheet_name} on attempt {attempt + 1}")
+                logging.error(f"CRITICAL: Write verification failed for {sheet_names} on attempt {attempt + 1}")
                 if attempt < retries - 1:
+                    # Ranges are fixed, so re-sending the batch overwrites rather than duplicates
                     logging.info("Retrying write operation...")
-                    time.sleep(2 ** attempt)
+                    backoff_sleep(attempt)
                     continue
                 else:
                     return False
             
-            logging.info(f"Successfully wrote and verified data to {sheet_name}")
+            logging.info(f"Successfully wrote and verified data to {sheet_names}")
             return True
             
         except HttpError as e:
-            logging.error(f"Google Sheets API error on attempt {attempt + 1} for {sheet_name}: {e}")
+            logging.error(f"Google Sheets API error on attempt {attempt + 1} for {sheet_names}: {e}")
             if attempt < retries - 1:
-                logging.info(f"Retrying in {2 ** attempt} seconds...")
-                time.sleep(2 ** attempt)
+                if not retry_after_http_error(e, attempt):
+                    return False
             else:
-                logging.error(f"All retry attempts failed for {sheet_name}")
+                logging.error(f"All retry attempts failed for {sheet_names}")
                 
-        except Exception as e:
-            logging.error(f"Unexpected error on attempt {attempt + 1} for {sheet_name}: {e}")
+        except RECOVERABLE_ERRORS as e:
+            logging.error(f"Network error on attempt {attempt + 1} for {sheet_names}: {e}")
             if attempt < retries - 1:
-                time.sleep(2 ** attempt)
+                backoff_sleep(attempt)
+                
+        except Exception as e:
+            logging.error(f"Unrecoverable error writing to {sheet_names}, not retrying: {e}")
+            return False
             
     return False
 
+def write_to_google_sheets_robust(service, spreadsheet_id: str, payloads: List[Tuple[str, int, List[List]]], retries: int = 3) -> Tuple[bool, Dict[str, int]]:
+    """Write data to Google Sheets with enhanced error handling and verification.
+    
+    payloads is a list of (sheet_name, start_row, rows), written starting at A{start_row}.
+    Returns (success, rows_written) where rows_written maps each sheet name to the number
+    of its rows that landed, counted from the start of its first payload.
+    """
+    payloads = [(sheet_name, start_row, rows) for sheet_name, start_row, rows in payloads if rows]
+    rows_written = {}
+    if not payloads:
+        logging.info("No data to write to Google Sheets")
+        return True, rows_written
+    
+    # Keep each request well inside the Sheets request size limits; chunks are written in order
+    # and the first failure stops the rest, leaving the earlier chunks in place
+    chunks = split_payloads(payloads, SHEETS_MAX_ROWS_PER_REQUEST)
+    if len(chunks) > 1:
+        logging.info(f"Splitting write of {sum(len(rows) for _, _, rows in payloads)} rows into {len(chunks)} requests")
+    for chunk in chunks:
+        if not write_payload_chunk(service, spreadsheet_id, chunk, retries):
+            return False, rows_written
+        for sheet_name, _, rows in chunk:
+            rows_written[sheet_name] = rows_written.get(sheet_name, 0) + len(rows)
+    return True, rows_written
+
+def get_csv_backup_filename(sheet_type):
+    """Determine CSV backup filename based on sheet type"""
+    if 'course' in sheet_type and 'success' in sheet_type:
+        return COURSE_SUCCESS_CSV_BACKUP
+    elif 'course' in sheet_type and 'failed' in sheet_type:
+        return COURSE_FAILED_CSV_BACKUP
+    elif 'ad' in sheet_type and 'success' in sheet_type:
+        return AD_SUCCESS_CSV_BACKUP
+    elif 'ad' in sheet_type and 'failed' in sheet_type:
+        return AD_FAILED_CSV_BACKUP
+    else:
+        return f"campaign_{sheet_type}_backup.csv"
+
+# Move the write position below rows added since the sheet was read
+def refresh_next_sheet_rows(sheets_service, spreadsheet_id, sheet_names) -> bool:
+    """Re-read each sheet from its next free row and skip past anything found there.
+    
+    Rows are written to fixed ranges, so rows added by someone else (or another run) since
+    the IDs were read would otherwise be overwritten. Returns False if the check failed.
+    """
+    sheet_names = [
+        sheet_name for sheet_name in dict.fromkeys(sheet_names)
+        if get_next_sheet_row(spreadsheet_id, sheet_name) is not None
+    ]
+    if not sheet_names:
+        return True
+    ranges = [f"{sheet_name}!A{get_next_sheet_row(spreadsheet_id, sheet_name)}:T" for sheet_name in sheet_names]
+    values, error = batch_get_ranges(sheets_service, spreadsheet_id, ranges)
+    if values is None:
+        logging.error(f"Could not check {', '.join(sheet_names)} for new rows before writing: {error}")
+        return False
+    
+    cache = None
+    for sheet_name, rows in zip(sheet_names, values):
+        if not rows:
+            continue
+        logging.warning(f"{len(rows)} rows were added to {sheet_name} since it was read - writing below them")
+        _sheet_row_counts[(spreadsheet_id, sheet_name)] = get_next_sheet_row(spreadsheet_id, sheet_name) - 1 + len(rows)
+        # Their IDs are not in the cache, so the next run has to read this sheet in full
+        if cache is None:
+            cache = load_existing_ids_cache()
+        cache.pop(f"{spreadsheet_id}:{sheet_name}", None)
+    if cache is not None:
+        save_existing_ids_cache(cache)
+    return True
+
 # Append data to Google Sheets with robust error handling
-def append_to_sheet(sheets_service, spreadsheet_id, sheet_name, data, sheet_type, campaign, environment):
-    """Append data to Google Sheet with robust error handling and local backup"""
-    if not data:
-        logging.info(f"No data to append to sheet {sheet_name}")
+def append_to_sheets(sheets_service, spreadsheet_id, pending, campaign, environment):
+    """Append data for several sheets in one write, with robust error handling and local backup
+    
+    pending is a list of (sheet_type, sheet_name, data). Returns the number of cells written.
+    """
+    pending = [(sheet_type, sheet_name, data) for sheet_type, sheet_name, data in pending if data]
+    if not pending:
+        logging.info("No data to append to any sheet")
         return 0
         
     try:
-        # Determine CSV backup filename based on sheet type
-        if 'course' in sheet_type and 'success' in sheet_type:
-            csv_filename = COURSE_SUCCESS_CSV_BACKUP
-        elif 'course' in sheet_type and 'failed' in sheet_type:
-            csv_filename = COURSE_FAILED_CSV_BACKUP
-        elif 'ad' in sheet_type and 'success' in sheet_type:
-            csv_filename = AD_SUCCESS_CSV_BACKUP
-        elif 'ad' in sheet_type and 'failed' in sheet_type:
-            csv_filename = AD_FAILED_CSV_BACKUP
-        else:
-            csv_filename = f"campaign_{sheet_type}_backup.csv"
+        rows_checked = refresh_next_sheet_rows(sheets_service, spreadsheet_id, [sheet_name for _, sheet_name, _ in pending])
+        
+        payloads = []
+        written = []
+        queued_rows = {}
+        for sheet_type, sheet_name, data in pending:
+            # Save to local CSV backup; later batches of the same run are appended
+            csv_filename = get_csv_backup_filename(sheet_type)
+            save_to_csv(data, csv_filename, 'a' if sheet_type in _backed_up_sheet_types else 'w')
+            _backed_up_sheet_types.add(sheet_type)
+            
+            # Without a current row count we cannot safely pick a target range
+            start_row = get_next_sheet_row(spreadsheet_id, sheet_name) if rows_checked else None
+            if start_row is None:
+                logging.error(f"CRITICAL: Existing rows of {sheet_name} could not be read - skipping write")
+                print(f"CRITICAL ERROR: Could not read {sheet_name}. Data saved to local CSV backup: {csv_filename}")
+                continue
+            
+            # Several batches for the same sheet go one below the other
+            start_row += queued_rows.get(sheet_name, 0)
+            queued_rows[sheet_name] = queued_rows.get(sheet_name, 0) + len(data)
+            
+            payloads.append((sheet_name, start_row, data))
+            written.append((sheet_type, sheet_name, data))
+        
+        # Write all sheets to Google Sheets in one request with robust error handling
+        sheets_success, rows_written = write_to_google_sheets_robust(sheets_service, spreadsheet_id, payloads)
         
-        # Save to local CSV backup
-        save_to_csv(data, csv_filename)
+        # A failed write may still have landed its earlier chunks; keep only the rows that did,
+        # taking the batches of each sheet in the order they were laid out
+        landed = []
+        remaining = dict(rows_written)
+        for sheet_type, sheet_name, data in written:
+            row_count = min(len(data), remaining.get(sheet_name, 0))
+            remaining[sheet_name] = remaining.get(sheet_name, 0) - row_count
+            if row_count:
+                landed.append((sheet_type, sheet_name, data[:row_count]))
         
-        # Write to Google Sheets with robust error handling
-        sheets_success = write_to_google_sheets_robust(sheets_service, spreadsheet_id, sheet_name, data)
+        # Later batches of this run continue below the rows just written
+        for sheet_name, row_count in rows_written.items():
+            _sheet_row_counts[(spreadsheet_id, sheet_name)] = get_next_sheet_row(spreadsheet_id, sheet_name) - 1 + row_count
+        if landed:
+            record_written_ids(spreadsheet_id, landed)
         
-        if sheets_success:
+        total_cells = 0
+        counters = load_local_counters()
+        for sheet_type, sheet_name, data in landed:
             updated_cells = len(data) * (len(data[0]) if data else 0)
+            total_cells += updated_cells
             logging.info(f"Data added to sheet: {updated_cells} cells updated")
             print(f"Data added to {sheet_name}: {updated_cells} cells updated")
             
             # Update local counters after successful write and verification
-            counters = load_local_counters()
-            updated_counters = update_counters_after_processing(counters, sheet_type, len(data), campaign, environment)
-            save_local_counters(updated_counters)
-            
+            counters = update_counters_after_processing(counters, sheet_type, len(data), campaign, environment)
             logging.info(f"Successfully processed {len(data)} new {sheet_type} records")
-            return updated_cells
-            
-        else:
+        if landed:
+            save_local_counters(counters)
+        
+        if not sheets_success:
             logging.error("CRITICAL: Failed to write to Google Sheets - data is saved to local CSV files")
             logging.error("Manual intervention may be required to prevent duplicate processing on next run")
-            logging.error("*** LOCAL COUNTERS NOT UPDATED DUE TO WRITE FAILURE ***")
-            print(f"CRITICAL ERROR: Failed to write to Google Sheets. Data saved to local CSV backup: {csv_filename}")
-            return 0
+            logging.error("*** LOCAL COUNTERS ONLY UPDATED FOR ROWS WRITTEN BEFORE THE FAILURE ***")
+            print("CRITICAL ERROR: Failed to write to Google Sheets. Data saved to local CSV backups")
+        
+        return total_cells
         
     except Exception as e:
         logging.error(f"Error appending data to Google Sheets: {e}")
         print(f"Error appending data to Google Sheets: {e}")
         return 0
 
+# Range to read a source sheet for merging
+def get_merge_read_range(spreadsheet_id, sheet_name):
+    """Return (range, row_limit) covering the rows of sheet_name known this run plus some slack.
+    
+    row_limit is None when the row count is unknown and the whole A:T range is read.
+    """
+    row_count = _sheet_row_counts.get((spreadsheet_id, sheet_name))
+    if row_count is None:
+        return f"{sheet_name}!A:T", None  # Include all columns (assuming 20 columns max)
+    row_limit = max(row_count, 1) + MERGE_READ_SLACK_ROWS
+    return f"{sheet_name}!A1:T{row_limit}", row_limit
+
+# Read several ranges in one request
+def batch_get_ranges(sheets_service, spreadsheet_id, ranges, retries=3):
+    """Read ranges with one values.batchGet.
+    
+    Returns (values, error): values is a list of row lists in range order, or None if the
+    read failed, in which case error is the last exception raised.
+    """
+    ranges_label = ', '.join(ranges)
+    error = None
+    for attempt in range(retries):
+        try:
+            result = sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=ranges,
+                fields='valueRanges(values)'  # Only the cell values are used
+            ).execute()
+            value_ranges = result.get('valueRanges', [])
+            return [
+                value_ranges[i].get('values', []) if i < len(value_ranges) else []
+                for i in range(len(ranges))
+            ], None
+        except HttpError as e:
+            error = e
+            logging.error(f"Error reading {ranges_label} on attempt {attempt + 1}: {e}")
+            if attempt < retries - 1:
+                if not retry_after_http_error(e, attempt):
+                    break
+            else:
+                logging.error(f"Failed to read {ranges_label} after all attempts")
+        except RECOVERABLE_ERRORS as e:
+            error = e
+            logging.error(f"Network error reading {ranges_label} on attempt {attempt + 1}: {e}")
+            if attempt < retries - 1:
+                backoff_sleep(attempt)
+            else:
+                logging.error(f"Failed to read {ranges_label} after all attempts")
+    return None, error
+
+# Tell a missing sheet apart from other read failures
+def is_missing_range_error(error, range_name):
+    """True if error is the 400 "Unable to parse range" Google returns for range_name when its sheet does not exist"""
+    if not isinstance(error, HttpError) or getattr(error.resp, 'status', None) != 400:
+        return False
+    content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+    return f"Unable to parse range: {range_name}" in f"{error} {content}"
+
 # Merge sheets function - improved to only write new rows
 def merge_sheets(sheets_service, spreadsheet_id, campaign):
     """Merge course and landing page sheets if merge_sheet config is present"""
@@ -846,23 +1436,43 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
                 
             logging.info(f"Merging {course_sheet_name} and {ad_sheet_name} into {merge_sheet_name}")
             
-            # Read data from course sheet with retry logic
-            course_result = None
-            for attempt in range(3):
-                try:
-                    course_result = sheets_service.spreadsheets().values().get(
-                        spreadsheetId=spreadsheet_id,
-                        range=f"{course_sheet_name}!A:T"  # Include all columns (assuming 20 columns max)
-                    ).execute()
-                    break
-                except HttpError as e:
-                    logging.error(f"Error reading {course_sheet_name} on attempt {attempt + 1}: {e}")
-                    if attempt < 2:
-                        time.sleep(2 ** attempt)
-                    else:
-                        logging.error(f"Failed to read {course_sheet_name} after all attempts")
+            # Read the course, ad and merge sheets in one request, limited to the rows known to be in use
+            course_range, course_limit = get_merge_read_range(spreadsheet_id, course_sheet_name)
+            ad_range, ad_limit = get_merge_read_range(spreadsheet_id, ad_sheet_name)
+            merge_range = f"{merge_sheet_name}!A:A"  # Only the Ref column is needed to skip existing rows
+            all_rows, read_error = batch_get_ranges(sheets_service, spreadsheet_id, [course_range, ad_range, merge_range])
+            if all_rows is not None:
+                course_rows, ad_rows, merge_rows = all_rows
+            elif is_missing_range_error(read_error, merge_range):
+                # A missing merge sheet fails the whole batch, so read the source sheets on their own
+                merge_rows = None
+                source_rows, read_error = batch_get_ranges(sheets_service, spreadsheet_id, [course_range, ad_range])
+                if source_rows is None:
+                    logging.error(f"Could not read {course_sheet_name} and {ad_sheet_name}, skipping {merge_type} merge: {read_error}")
+                    continue
+                course_rows, ad_rows = source_rows
+            else:
+                # Any other failure (quota, server errors, timeouts) says nothing about whether the merge
+                # sheet exists, so creating it and writing from row 1 could overwrite merged rows
+                logging.error(f"Could not read sheets for {merge_type} merge into {merge_sheet_name}, skipping: {read_error}")
+                continue
+            
+            # A read that filled its whole range may have been cut short - re-read those sheets in full
+            truncated = [
+                sheet_name for sheet_name, rows, limit in (
+                    (course_sheet_name, course_rows, course_limit),
+                    (ad_sheet_name, ad_rows, ad_limit)
+                )
+                if limit and len(rows) >= limit
+            ]
+            if truncated:
+                logging.warning(f"Row limit reached for {', '.join(truncated)}, re-reading full sheets")
+                full_rows, _ = batch_get_ranges(sheets_service, spreadsheet_id, [f"{sheet_name}!A:T" for sheet_name in truncated])
+                if full_rows is not None:
+                    full_by_sheet = dict(zip(truncated, full_rows))
+                    course_rows = full_by_sheet.get(course_sheet_name, course_rows)
+                    ad_rows = full_by_sheet.get(ad_sheet_name, ad_rows)
             
-            course_rows = course_result.get('values', []) if course_result else []
             if not course_rows:
                 logging.warning(f"No data found in {course_sheet_name}")
                 course_headers = []
@@ -873,23 +1483,6 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
                 course_data = course_rows[1:] if len(course_rows) > 1 else []
                 logging.info(f"Read {len(course_data)} rows from {course_sheet_name}")
             
-            # Read data from ad/landing page sheet with retry logic
-            ad_result = None
-            for attempt in range(3):
-                try:
-                    ad_result = sheets_service.spreadsheets().values().get(
-                        spreadsheetId=spreadsheet_id,
-                        range=f"{ad_sheet_name}!A:T"  # Include all columns (assuming 20 columns max)
-                    ).execute()
-                    break
-                except HttpError as e:
-                    logging.error(f"Error reading {ad_sheet_name} on attempt {attempt + 1}: {e}")
-                    if attempt < 2:
-                        time.sleep(2 ** attempt)
-                    else:
-                        logging.error(f"Failed to read {ad_sheet_name} after all attempts")
-            
-            ad_rows = ad_result.get('values', []) if ad_result else []
             if not ad_rows:
                 logging.warning(f"No data found in {ad_sheet_name}")
                 ad_headers = []
@@ -906,15 +1499,8 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
                 logging.warning(f"No headers found in either sheet for {merge_type}, skipping merge")
                 continue
             
-            # Read existing merged data to avoid adding duplicates
-            try:
-                merge_result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=spreadsheet_id,
-                    range=f"{merge_sheet_name}!A:T"  # Include all columns
-                ).execute()
-                
-                merge_rows = merge_result.get('values', [])
-                
+            # Use existing merged data to avoid adding duplicates
+            if merge_rows is not None:
                 if not merge_rows:
                     logging.info(f"No existing data found in {merge_sheet_name}")
                     existing_headers = []
@@ -926,16 +1512,13 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
                     existing_data = merge_rows[1:] if len(merge_rows) > 1 else []
                     
                     # Get existing keys (from first column)
-                    existing_keys = set()
-                    for row in existing_data:
-                        if row and len(row) > 0 and row[0]:
-                            existing_keys.add(str(row[0]))
+                    existing_keys = {str(row[0]) for row in existing_data if row and row[0]}
                     
                     logging.info(f"Found {len(existing_data)} existing rows in {merge_sheet_name} with {len(existing_keys)} unique keys")
                 
-            except Exception as e:
+            else:
                 # Sheet doesn't exist yet
-                logging.info(f"Merge sheet {merge_sheet_name} does not exist yet: {str(e)}")
+                logging.info(f"Merge sheet {merge_sheet_name} does not exist yet")
                 existing_headers = []
                 existing_data = []
                 existing_keys = set()
@@ -958,77 +1541,43 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
                     ).execute()
                     logging.info(f"Created new sheet {merge_sheet_name}")
                 except Exception as create_error:
-                    # If we fail here, it might be because the sheet exists with a different case
-                    logging.warning(f"Error creating sheet (might already exist): {create_error}")
-            
-            # Create a dictionary to hold merged data, using first column (Ref) as key
-            new_merged_data = {}
-            
-            # Add course data to merged_data if not already in existing_keys
-            for row in course_data:
-                if not row:  # Skip empty rows
+                    # The sheet might exist after all (e.g. with a different case); writing from row 1
+                    # could then overwrite it, so leave this merge for the next run
+                    logging.error(f"Error creating sheet {merge_sheet_name}, skipping {merge_type} merge: {create_error}")
                     continue
-                    
-                # Make sure row has a key (first column/Ref)
-                if len(row) > 0 and row[0]:
-                    key = str(row[0])  # Convert to string to ensure consistent key type
-                    
-                    # Only add if not already in existing data
-                    if key not in existing_keys:
-                        new_merged_data[key] = row
-                        
-                        # Pad row to match header length if needed
-                        while len(new_merged_data[key]) < len(headers):
-                            new_merged_data[key].append("")
             
-            # Add ad/landing page data to merged_data if not already in existing_keys
-            # (will overwrite course data in new_merged_data if same key)
-            for row in ad_data:
-                if not row:  # Skip empty rows
-                    continue
-                    
-                # Make sure row has a key (first column/Ref)
-                if len(row) > 0 and row[0]:
-                    key = str(row[0])  # Convert to string to ensure consistent key type
-                    
-                    # Only add if not already in existing data
-                    if key not in existing_keys:
-                        new_merged_data[key] = row
-                        
-                        # Pad row to match header length if needed
-                        while len(new_merged_data[key]) < len(headers):
-                            new_merged_data[key].append("")
+            # Create a dictionary to hold merged data, using first column (Ref) as key,
+            # skipping empty rows and keys already in the merge sheet; rows are padded to the header length.
+            # Ad/landing page rows come after course rows, so they overwrite course data with the same key
+            headers_len = len(headers)
+            source_keys = [str(row[0]) if row and row[0] else None for row in chain(course_data, ad_data)]
+            new_merged_data = {
+                key: row + [""] * (headers_len - len(row))
+                for key, row in zip(source_keys, chain(course_data, ad_data))
+                if key and key not in existing_keys
+            }
             
             # Convert new merged data back to list of rows
             new_merged_rows = list(new_merged_data.values())
+            
+            # Values are read back as text and written RAW, so turn numeric Refs back into numbers
+            # as USER_ENTERED did (the rows are padded copies, the source data is untouched)
+            for row in new_merged_rows:
+                if isinstance(row[0], str) and row[0].isdigit():
+                    row[0] = int(row[0])
             logging.info(f"Merged data has {len(new_merged_rows)} new rows to add")
             
             if not new_merged_rows:
                 logging.info(f"No new rows to add to {merge_sheet_name}, skipping update")
                 continue
             
-            # If sheet is empty, write headers first
+            # Append new data below the existing merged rows (row 1 is the header); an empty
+            # sheet gets its header row in the same batchUpdate
+            merge_start_row = len(existing_data) + 2
+            merge_payloads = [(merge_sheet_name, merge_start_row, new_merged_rows)]
             if not existing_headers:
-                # Write headers with retry logic
-                for attempt in range(3):
-                    try:
-                        sheets_service.spreadsheets().values().update(
-                            spreadsheetId=spreadsheet_id,
-                            range=f"{merge_sheet_name}!A1",
-                            valueInputOption='RAW',
-                            body={'values': [headers]}
-                        ).execute()
-                        logging.info(f"Wrote headers to {merge_sheet_name}")
-                        break
-                    except HttpError as e:
-                        logging.error(f"Error writing headers to {merge_sheet_name} on attempt {attempt + 1}: {e}")
-                        if attempt < 2:
-                            time.sleep(2 ** attempt)
-                        else:
-                            logging.error(f"Failed to write headers after all attempts")
-            
-            # Append new data to the merge sheet with robust error handling
-            sheets_success = write_to_google_sheets_robust(sheets_service, spreadsheet_id, merge_sheet_name, new_merged_rows)
+                merge_payloads.insert(0, (merge_sheet_name, 1, [headers]))
+            sheets_success, _ = write_to_google_sheets_robust(sheets_service, spreadsheet_id, merge_payloads)
             
             if sheets_success:
                 logging.info(f"Successfully merged data to {merge_sheet_name}: {len(new_merged_rows)} new rows")
@@ -1044,63 +1593,131 @@ def merge_sheets(sheets_service, spreadsheet_id, campaign):
     
     return total_new_merges
 
+# Query one sheet type on its own pooled connection
+def queue_sheet_rows(batch_queue, environment, campaign, status, source, sheet_type, sheet_name, existing_ids):
+    """Put the formatted new rows of one sheet on batch_queue in batches, then None when done
+    
+    Runs in a worker thread and only touches the database; the batches are written
+    to Google Sheets by the main thread. A database error only skips this sheet.
+    """
+    connection = None
+    cursor = None
+    try:
+        connection, cursor = connect_to_database(environment)
+        
+        # Course sheets are selected by course, ad sheets by landing page
+        load_existing_into_temp(cursor, existing_ids)
+        if source == 'course':
+            query = build_course_query(campaign, status)
+        else:
+            query = build_landing_page_query(campaign, status)
+        for batch in iter_query_results(cursor, campaign, status, source, query):
+            batch_queue.put((sheet_type, sheet_name, batch))
+    except Error as e:
+        logging.error(f"Database error for {sheet_type}, skipping this sheet: {e}")
+        print(f"Database error for {sheet_type}, skipping this sheet: {e}")
+    finally:
+        batch_queue.put(None)
+        # Always close database connections; close() needs no is_connected() ping first
+        if cursor is not None:
+            try:
+                # The cursor streams an unbuffered result; if reading stopped early (e.g. an error
+                # mid-fetch) the rest must be drained before the connection can be reused
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+                logging.info(f"Database cursor for {sheet_type} closed")
+            except Error as e:
+                logging.warning(f"Error closing database cursor for {sheet_type}: {e}")
+        if connection is not None:
+            try:
+                connection.close()
+                logging.info(f"MySQL connection for {sheet_type} returned to pool")
+            except Error as e:
+                logging.warning(f"Error returning MySQL connection for {sheet_type} to pool: {e}")
+
 # Main function
 def main():
     """Main function to orchestrate the script execution"""
     setup_logging()
     campaign, environment = parse_arguments()
     
-    connection = None
-    cursor = None
+    # Start every run from clean per-run state, also when main() is called again in the same process
+    _sheet_row_counts.clear()
+    _backed_up_sheet_types.clear()
     
     try:
-        # Connect to database
-        connection, cursor = connect_to_database(environment)
-        
-        # Set up Google Sheets
-        sheets_service = setup_google_sheets()
         spreadsheet_id = sheet_ids[campaign]
         
+        # Sheets to sync: (status, source, sheet_type, sheet_name)
+        sheet_targets = []
+        for status in ['success', 'failed']:
+            for source in ['course', 'ad']:
+                sheet_type = f'{source}_{status}'
+                sheet_targets.append((status, source, sheet_type, get_sheet_name(campaign, sheet_type)))
+        
         # Load local counters
         counters = load_local_counters()
         
-        total_updates = 0
-        
-        # Process each sheet type
-        for status in ['success', 'failed']:
-            # Get the course sheet name for this campaign
-            course_sheet_type = f'course_{status}'
-            course_sheet_name = get_sheet_name(campaign, course_sheet_type)
+        # One database worker per sheet type, each on its own pooled connection
+        with ThreadPoolExecutor(max_workers=min(len(sheet_targets), DB_WORKERS, DB_POOL_SIZE)) as executor:
+            # Open the pooled database connections in the background while Sheets is set up and read
+            pool_future = executor.submit(get_connection_pool, environment)
             
-            # Process course-based sheets
-            existing_ids = get_existing_sheet_ids(sheets_service, spreadsheet_id, course_sheet_name)
+            # Set up Google Sheets
+            sheets_service = setup_google_sheets()
             
-            # Verify sheet counts against local counters
-            count_verification_passed = verify_sheet_counts_against_local(existing_ids, counters, course_sheet_type)
-            if not count_verification_passed:
-                logging.warning(f"*** COUNT VERIFICATION FAILED FOR {course_sheet_type} - PROCEEDING WITH CAUTION ***")
+            # Read existing IDs of every sheet up front in one request (the Sheets client is not
+            # thread-safe, so this stays on the main thread and overlaps with the database handshake)
+            existing_ids_by_sheet = get_trusted_cached_ids(spreadsheet_id, sheet_targets, counters, campaign)
+            sheets_to_read = [sheet_name for _, _, _, sheet_name in sheet_targets if sheet_name not in existing_ids_by_sheet]
+            if sheets_to_read:
+                existing_ids_by_sheet.update(get_existing_sheet_ids(sheets_service, spreadsheet_id, sheets_to_read))
             
-            query = build_course_query(campaign, status, existing_ids)
-            data = process_query_results(cursor, campaign, status, 'course', query)
-            updated = append_to_sheet(sheets_service, spreadsheet_id, course_sheet_name, data, course_sheet_type, campaign, environment)
-            total_updates += updated
+            pool_future.result()
             
-            # Get the ad campaign sheet name for this campaign
-            ad_sheet_type = f'ad_{status}'
-            ad_sheet_name = get_sheet_name(campaign, ad_sheet_type)
+            # Verify sheet counts against local counters
+            for status, source, sheet_type, sheet_name in sheet_targets:
+                count_verification_passed = verify_sheet_counts_against_local(existing_ids_by_sheet[sheet_name], counters, sheet_type)
+                if not count_verification_passed:
+                    logging.warning(f"*** COUNT VERIFICATION FAILED FOR {sheet_type} - PROCEEDING WITH CAUTION ***")
             
-            # Process ad campaign-based sheets
-            existing_ids = get_existing_sheet_ids(sheets_service, spreadsheet_id, ad_sheet_name)
+            # Query all sheet types at once; workers hand formatted batches back through the queue
+            # and every Sheets write happens on this thread. The queue is unbounded so a worker can
+            # never block on it if this thread stops reading early.
+            batch_queue = queue.Queue()
+            query_futures = [
+                executor.submit(
+                    queue_sheet_rows, batch_queue, environment, campaign,
+                    status, source, sheet_type, sheet_name, existing_ids_by_sheet[sheet_name]
+                )
+                for status, source, sheet_type, sheet_name in sheet_targets
+            ]
             
-            # Verify sheet counts against local counters
-            count_verification_passed = verify_sheet_counts_against_local(existing_ids, counters, ad_sheet_type)
-            if not count_verification_passed:
-                logging.warning(f"*** COUNT VERIFICATION FAILED FOR {ad_sheet_type} - PROCEEDING WITH CAUTION ***")
+            # Rows waiting to be written; flushed together in one request per SHEETS_WRITE_BATCH_ROWS
+            pending_writes = []
+            pending_rows = 0
+            total_updates = 0
             
-            query = build_landing_page_query(campaign, status, existing_ids)
-            data = process_query_results(cursor, campaign, status, 'ad', query)
-            updated = append_to_sheet(sheets_service, spreadsheet_id, ad_sheet_name, data, ad_sheet_type, campaign, environment)
-            total_updates += updated
+            running = len(query_futures)
+            while running:
+                item = batch_queue.get()
+                if item is None:
+                    running -= 1
+                    continue
+                pending_writes.append(item)
+                pending_rows += len(item[2])
+                if pending_rows >= SHEETS_WRITE_BATCH_ROWS:
+                    total_updates += append_to_sheets(sheets_service, spreadsheet_id, pending_writes, campaign, environment)
+                    pending_writes = []
+                    pending_rows = 0
+        
+        # Write whatever is left (usually all four sheets) in a single Sheets request
+        total_updates += append_to_sheets(sheets_service, spreadsheet_id, pending_writes, campaign, environment)
+        
+        # Surface any unexpected error raised in a worker, once the other sheets' rows are written
+        for future in query_futures:
+            future.result()
         
         # Merge sheets if merge_sheet config is present
         total_merges = 0
@@ -1121,17 +1738,10 @@ def main():
         return 1
         
     finally:
-        # Always close database connections
-        if cursor:
-            cursor.close()
-            logging.info("Database cursor closed")
-        if connection and connection.is_connected():
-            connection.close()
-            logging.info("MySQL connection closed")
-        
         logging.info("Script execution completed")
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"\nScript execution completed at {timestamp}")
+        stop_logging()
     
     return 0
 
@@ -132,9 +132,19 @@ merge_sheet = {
     }
     # Add more campaign-specific merge sheet names as needed
 }
+# Sheet names resolved once for every configured campaign and default sheet type
+sheet_name_cache = {
+    (campaign, sheet_type): campaign_sheet_names.get(campaign, {}).get(sheet_type, default_name)
+    for campaign in set(sheet_ids) | set(campaign_sheet_names)
+    for sheet_type, default_name in default_sheet_names.items()
+}
+
 # Function to get sheet name based on campaign and sheet type
 def get_sheet_name(campaign, sheet_type):
     """Get sheet name for a specific campaign and sheet type"""
+    name = sheet_name_cache.get((campaign, sheet_type))
+    if name is not None:
+        return name
     # Check if campaign has custom sheet names
     if campaign in campaign_sheet_names and sheet_type in campaign_sheet_names[campaign]:
         return campaign_sheet_names[campaign][sheet_type]
@@ -166,5 +176,6 @@ juspay_status = {
 # Google Sheets API configuration
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 CREDENTIALS_FILE = './credentials.json'
-TOKEN_FILE = './token.pickle'
+TOKEN_FILE = './token.json'
+LEGACY_TOKEN_FILE = './token.pickle'  # Pickled token from older versions, migrated on first run
 prefill_key="sjkdfjlkjkldfjkldjfkleoripoerdmfk"
@@ -20,9 +20,18 @@ import pickle
 import logging
 import json
 import time
+import random
+import threading
+import hashlib
+import functools
+from operator import itemgetter
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -74,8 +83,62 @@ TOKEN_FILE = 'token.pickle'
 CREDENTIALS_FILE = 'credentials.json'
 FB_API_VERSION = 'v17.0'
 MAX_ATTEMPTS = 5
-BATCH_SIZE = 10  # Number of events to send in a batch
-RATE_LIMIT_DELAY = 2  # Seconds to wait between API calls to avoid rate limiting
+BATCH_SIZE = 10  # Number of events to send in a batch (one API request)
+CONCURRENT_REQUESTS = 4  # Batches sent at the same time
+HTTP_RETRIES = 3  # Retries of a request that could not connect (it never reached Facebook)
+SHEETS_WRITE_INTERVAL = 15  # Seconds between background writes of results to the sheet (plus one at the end)
+SHEETS_WRITE_RETRIES = 5  # Attempts of a sheet write on quota (429), server and network errors
+SHEETS_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+SENT_LEDGER_FILE = 'fbclid_sent_ledger.json'  # Conversions already sent but not yet marked 'Y' in the sheet
+RATE_LIMIT_DELAY = 2  # Base wait in seconds after a round that hit throttling or server errors
+REQUESTS_PER_SECOND = 20  # Sustained Conversion API request rate (each request carries up to BATCH_SIZE events)
+REQUEST_BURST = 20  # Requests that may be sent back to back before the rate applies
+MIN_REQUESTS_PER_SECOND = 1  # Floor when slowing down on high usage
+USAGE_SLOWDOWN_PERCENT = 80  # Halve the request rate when Facebook reports usage at or above this
+USAGE_RECOVER_PERCENT = 50  # Double it again (up to REQUESTS_PER_SECOND) when usage is below this
+RATE_ADJUST_COOLDOWN = 10  # Seconds between rate changes, so concurrent responses reporting the same usage count once
+MAX_BACKOFF_DELAY = 60  # Cap in seconds of the wait after rounds that hit throttling or server errors
+
+# Facebook error codes (error.code in the response body) that are not the row's fault
+FB_THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80004}  # Rate limits, retried on a later round
+FB_AUTH_ERROR_CODES = {10, 190, 200}  # Bad token or missing permission, nothing can be sent
+FB_UNKNOWN_OBJECT_ERROR = (100, 33)  # (code, error_subcode) of a pixel_id that does not exist
+
+# fbclid_sent value of rows Facebook rejected as invalid; the filter skips them like sent rows
+FBCLID_REJECTED = 'X'
+
+# Cell values compared without case; matching against both cases avoids an upper() copy per row
+YES_VALUES = frozenset({'Y', 'y'})
+DONE_SENT_VALUES = frozenset({'Y', 'y', FBCLID_REJECTED, FBCLID_REJECTED.lower()})  # fbclid_sent values that are not sent again
+
+# Root log level; DEBUG logs raw user data and unredacted payloads, so it is opt-in
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Submitted date formats seen in the sheets - adjust as needed based on your date format
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S')
+_date_format_hint = [0]  # Index into DATE_FORMATS of the format that matched last
+
+# user_data keys hashed directly from a column, per sheet type (participant names are split separately)
+HASHED_USER_FIELDS = {
+    'leads': (('em', 'email'), ('ph', 'phone'), ('fn', 'first_name'), ('ln', 'last_name')),
+    'participants': (('em', 'email'), ('ph', 'phone'))
+}
+
+# Event parameters - same for both sheet types
+EVENT_NAME = 'Purchase V2'
+EVENT_CURRENCY = 'INR'
+EVENT_VALUE = 1.0
+EVENT_ACTION_SOURCE = 'website'
+
+# Request bodies are encoded once, without the whitespace json.dumps adds by default
+JSON_SEPARATORS = (',', ':')
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Columns identifying one conversion: its event_id (which Facebook dedupes resends on) is derived from them
+CONVERSION_KEY_COLUMNS = ('fbclid', 'submitted_date', 'email')
+
+# Campaign parameters copied into custom_data
+UTM_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_content', 'utm_term')
 
 # Column mappings for different sheet types (0-indexed)
 COLUMN_MAPS = {
@@ -125,8 +188,9 @@ def setup_logging():
             logging.StreamHandler(sys.stdout)
         ]
     )
-    logging.getLogger().setLevel(logging.DEBUG)  # Changed to DEBUG
-    logging.info("Logging initialized with DEBUG level")
+    # Defaults to DEBUG; set LOG_LEVEL=INFO to drop the unredacted payloads and per-value hashes
+    logging.getLogger().setLevel(LOG_LEVEL)
+    logging.info(f"Logging initialized with {LOG_LEVEL} level")
 
 # Parse command line arguments
 def parse_arguments():
@@ -186,6 +250,89 @@ def setup_google_sheets():
         print(f"Error setting up Google Sheets API: {e}")
         sys.exit(1)
 
+# HTTP session for the Facebook API
+def create_http_session():
+    """Create a keep-alive requests session for the Facebook API
+    
+    The connection pool fits CONCURRENT_REQUESTS concurrent sends. urllib3 only retries
+    failed connections: a POST that reached Facebook may already have been processed, so
+    read errors, 429 and 5xx are returned and handled by classify_api_error and the round
+    backoff, which also keeps every request going through the rate limiter.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=0,
+        backoff_factor=0.3,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CONCURRENT_REQUESTS, max_retries=retry)
+    session.mount('https://', adapter)
+    return session
+
+# Token bucket limiting the Facebook API request rate
+def create_rate_limiter(rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST):
+    """Create a token bucket shared by all sending threads; one token is spent per request"""
+    now = time.monotonic()
+    return {
+        'rate': rate,
+        'max_rate': rate,
+        'capacity': capacity,
+        'tokens': capacity,
+        'updated': now,
+        'adjusted': now - RATE_ADJUST_COOLDOWN,  # When the rate last changed
+        'lock': threading.Lock()
+    }
+
+def acquire_token(limiter):
+    """Take a token from the bucket, waiting only while it is empty"""
+    while True:
+        with limiter['lock']:
+            now = time.monotonic()
+            limiter['tokens'] = min(limiter['capacity'], limiter['tokens'] + (now - limiter['updated']) * limiter['rate'])
+            limiter['updated'] = now
+            if limiter['tokens'] >= 1:
+                limiter['tokens'] -= 1
+                return
+            wait = (1 - limiter['tokens']) / limiter['rate']
+        time.sleep(wait)
+
+# Slow down when Facebook reports the app or ad account close to its limits
+def adjust_rate_limiter(limiter, response):
+    """Adjust the request rate to the X-App-Usage and X-Business-Use-Case-Usage headers
+    
+    The rate is halved when usage is near 100% and doubled back towards its starting value
+    once usage drops, at most once per RATE_ADJUST_COOLDOWN seconds.
+    """
+    usage = 0
+    try:
+        app_usage = response.headers.get('X-App-Usage')
+        if app_usage:
+            usage = max([usage, *json.loads(app_usage).values()])
+        business_usage = response.headers.get('X-Business-Use-Case-Usage')
+        if business_usage:
+            for entries in json.loads(business_usage).values():
+                for entry in entries:
+                    usage = max(usage, entry.get('call_count', 0), entry.get('total_cputime', 0), entry.get('total_time', 0))
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.debug(f"Could not parse Facebook usage headers: {e}")
+        return
+    
+    with limiter['lock']:
+        now = time.monotonic()
+        if now - limiter['adjusted'] < RATE_ADJUST_COOLDOWN:
+            return
+        if usage >= USAGE_SLOWDOWN_PERCENT and limiter['rate'] > MIN_REQUESTS_PER_SECOND:
+            limiter['rate'] = max(MIN_REQUESTS_PER_SECOND, limiter['rate'] / 2)
+            limiter['adjusted'] = now
+            logging.warning(f"Facebook API usage at {usage}%, slowing down to {limiter['rate']} requests per second")
+        elif usage < USAGE_RECOVER_PERCENT and limiter['rate'] < limiter['max_rate']:
+            limiter['rate'] = min(limiter['max_rate'], limiter['rate'] * 2)
+            limiter['adjusted'] = now
+            logging.info(f"Facebook API usage at {usage}%, speeding back up to {limiter['rate']} requests per second")
+
 # Read data from Google Sheet
 def read_sheet_data(service, config, sheet_name):
     """Read data from the Google Sheet"""
@@ -214,52 +361,98 @@ def read_sheet_data(service, config, sheet_name):
         print(f"Error reading data from Google Sheet {sheet_name}: {e}")
         return [], []
 
+# Read all configured sheets from Google Sheets
+def read_all_sheets(service, config):
+    """Read every sheet in the configuration with one batchGet; returns {sheet_name: (headers, data)}"""
+    sheet_names = [sheet_config['name'] for sheet_config in config['sheets']]
+    try:
+        logging.info(f"Reading data from sheets: {', '.join(sheet_names)}")
+        
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=config['sheet_id'],
+            ranges=sheet_names
+        ).execute()
+        
+        sheets_data = {}
+        for sheet_name, value_range in zip(sheet_names, result.get('valueRanges', [])):
+            values = value_range.get('values', [])
+            if not values:
+                logging.warning(f"No data found in sheet {sheet_name}.")
+                sheets_data[sheet_name] = ([], [])
+                continue
+            
+            headers = values[0]
+            data = values[1:] if len(values) > 1 else []
+            logging.info(f"Found {len(data)} rows of data in {sheet_name} (excluding header)")
+            sheets_data[sheet_name] = (headers, data)
+        
+        return sheets_data
+        
+    except Exception as e:
+        # One missing sheet fails the whole batch, so fall back to reading them one at a time
+        logging.error(f"Error reading sheets in one request, reading them one at a time: {e}")
+        return {sheet_name: read_sheet_data(service, config, sheet_name) for sheet_name in sheet_names}
+
+# Local record of conversions already sent
+def load_sent_ledger():
+    """Load the sent conversion IDs (see conversion_id) per 'sheet_id:sheet_name' from the local ledger file"""
+    try:
+        if os.path.exists(SENT_LEDGER_FILE):
+            with open(SENT_LEDGER_FILE, 'r') as f:
+                return {key: set(conversion_ids) for key, conversion_ids in json.load(f).items()}
+    except Exception as e:
+        logging.error(f"Error loading sent ledger: {e}")
+    return {}
+
+def save_sent_ledger(ledger):
+    """Save the sent conversion IDs per sheet to the local ledger file"""
+    try:
+        with open(SENT_LEDGER_FILE, 'w') as f:
+            json.dump({key: list(conversion_ids) for key, conversion_ids in ledger.items() if conversion_ids}, f)
+    except Exception as e:
+        logging.error(f"Error saving sent ledger: {e}")
+
 # Filter rows that need fbclid to be sent
 def filter_rows_to_process(data, column_map, check_converted=True):
     """Filter rows that need processing based on sheet type
     
-    For leads sheet: Converted='Y', fbclid is not empty, fbclid_sent is not 'Y', attempts < MAX_ATTEMPTS
-    For participants sheet: fbclid is not empty, fbclid_sent is not 'Y', attempts < MAX_ATTEMPTS
+    For leads sheet: Converted='Y', fbclid is not empty, fbclid_sent is not 'Y' or 'X', attempts < MAX_ATTEMPTS
+    For participants sheet: fbclid is not empty, fbclid_sent is not 'Y' or 'X', attempts < MAX_ATTEMPTS
     """
     rows_to_process = []
     
+    # Resolve column indices and settings once, outside the row loop
+    max_idx = max(column_map.values())
+    pad = [""] * (max_idx + 1)
+    fbclid_i = column_map['fbclid']
+    sent_i = column_map['fbclid_sent']
+    attempts_i = column_map['attempts']
+    check_converted = check_converted and 'converted' in column_map
+    max_attempts = MAX_ATTEMPTS
+    
+    # Fetch all cells the filter needs with one C-level call per row
+    # (without a converted check, fbclid is fetched again in its place)
+    get_cells = itemgetter(fbclid_i, sent_i, attempts_i, column_map['converted'] if check_converted else fbclid_i)
+    
     for index, row in enumerate(data):
-        # Ensure the row has enough columns
-        while len(row) <= max(column_map.values()):
-            row.append("")
+        # Work on a padded copy of short rows, leaving the sheet data as read
+        if len(row) <= max_idx:
+            row = row + pad[len(row):]
         
-        # Get relevant values
-        try:
-            fbclid = row[column_map['fbclid']] if column_map['fbclid'] < len(row) else ""
-            fbclid_sent = row[column_map['fbclid_sent']].upper() if column_map['fbclid_sent'] < len(row) and row[column_map['fbclid_sent']] else ""
-            attempts_str = row[column_map['attempts']] if column_map['attempts'] < len(row) and row[column_map['attempts']] else "0"
-            
-            # Convert attempts to integer, default to 0 if not a valid number
-            try:
-                attempts = int(attempts_str)
-            except ValueError:
-                attempts = 0
-            
-            # Check converted status if required
-            converted_check = True
-            if check_converted:
-                if 'converted' in column_map:
-                    converted = row[column_map['converted']].upper() if column_map['converted'] < len(row) and row[column_map['converted']] else ""
-                    converted_check = (converted == 'Y')
-            
-            # Check if row meets criteria for processing
-            if (
-                converted_check and 
-                fbclid and 
-                fbclid_sent != 'Y' and 
-                attempts < MAX_ATTEMPTS
-            ):
-                rows_to_process.append((index + 2, row))  # +2 for 1-indexed row and header row
-                logging.info(f"Row {index + 2} selected for processing - fbclid: {fbclid}")
-            
-        except Exception as e:
-            logging.warning(f"Error processing row {index + 2}: {e}")
+        # Check if row meets criteria for processing
+        fbclid, fbclid_sent, attempts_str, converted = get_cells(row)
+        if not fbclid or fbclid_sent in DONE_SENT_VALUES:
+            continue
+        if check_converted and converted not in YES_VALUES:
             continue
+        
+        # Non-numeric attempts count as 0
+        attempts = int(attempts_str) if attempts_str.isdigit() else 0
+        if attempts >= max_attempts:
+            continue
+        
+        rows_to_process.append((index + 2, row))  # +2 for 1-indexed row and header row
+        logging.info(f"Row {index + 2} selected for processing - fbclid: {fbclid}")
     
     logging.info(f"Found {len(rows_to_process)} rows to process")
     return rows_to_process
@@ -285,46 +478,79 @@ def hash_data(data):
     if not data:
         return None
     
-    import hashlib
-    
     # Normalize: lowercase and remove whitespace
-    normalized = data.lower().strip()
-    
-    # Hash using SHA256
-    hashed = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    return hash_normalized(data.lower().strip())
+
+@functools.lru_cache(maxsize=65536)
+def hash_normalized(normalized):
+    """SHA256 of a normalized value (cached on the normalized value, as emails and phones repeat
+    across rows, often with different case or surrounding spaces)"""
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+# Parse a submitted date from the sheet
+def parse_submitted_date(submitted_date_str):
+    """Parse a submitted date string to a Unix timestamp, or None if no known format matches
     
-    logging.debug(f"Hashed value: {data} -> {hashed}")
-    return hashed
+    A sheet uses one format throughout, so the format that matched last is tried first.
+    """
+    hint = _date_format_hint[0]
+    for i in (hint, *(j for j in range(len(DATE_FORMATS)) if j != hint)):
+        try:
+            dt_obj = datetime.strptime(submitted_date_str, DATE_FORMATS[i])
+        except ValueError:
+            continue
+        _date_format_hint[0] = i
+        return int(dt_obj.timestamp())
+    return None
 
-# Send fbclid to Facebook Conversion API
-def send_to_facebook(row, row_index, column_map, config, sheet_type):
-    """Send fbclid to Facebook Conversion API"""
-    try:
-        fbclid = row[column_map['fbclid']]
+# Read an optional cell from a row
+def safe_cell(row, i):
+    """Return the row's value at column index i, or '' if the sheet type has no such column (i < 0) or the row is short"""
+    return row[i] if 0 <= i < len(row) else ''
+
+# Identify the conversion a row records
+def conversion_key_columns(column_map):
+    """Column indices of CONVERSION_KEY_COLUMNS for a sheet type (-1 where it has no such column)"""
+    return tuple(column_map.get(key, -1) for key in CONVERSION_KEY_COLUMNS)
+
+def conversion_id(row, key_columns):
+    """Stable ID of a row's conversion, the same on every run so resent events are deduplicated"""
+    key = '|'.join(safe_cell(row, col) for col in key_columns)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+# Build the Conversion API event builder for one sheet type
+def make_event_builder(sheet_type, column_map):
+    """Return build_event(row, row_index) specialized for a sheet type
+    
+    Column indices are resolved once and bound in the closure, and the checks for columns
+    the sheet type does not have are decided here rather than for every row.
+    """
+    fbclid_col = column_map['fbclid']
+    submitted_date_col = column_map.get('submitted_date', -1)
+    name_col = column_map.get('name', -1) if sheet_type == 'participants' else -1  # Participants sheet has a single name field
+    ip_address_col = column_map.get('ip_address', -1)
+    url_col = column_map.get('url', -1)
+    user_columns = tuple((fb_key, col_key, column_map[col_key]) for fb_key, col_key in HASHED_USER_FIELDS[sheet_type] if col_key in column_map)
+    utm_columns = tuple((utm_param, column_map[utm_param]) for utm_param in UTM_PARAMS if utm_param in column_map)
+    key_columns = conversion_key_columns(column_map)
+    
+    def build_event(row, row_index):
+        """Build the Facebook Conversion API event for a row"""
+        fbclid = row[fbclid_col]
         logging.info(f"Sending fbclid {fbclid} to Facebook (row {row_index}) from {sheet_type} sheet")
         
         # Get submitted date/time for event_time
         event_time = int(time.time())  # Default to current time
-        if column_map.get('submitted_date') is not None and column_map.get('submitted_date') < len(row) and row[column_map['submitted_date']]:
+        submitted_date = safe_cell(row, submitted_date_col)
+        if submitted_date:
             try:
                 # Try to parse the submitted date string to a timestamp
-                submitted_date_str = row[column_map['submitted_date']]
-                # Check common date formats - adjust as needed based on your date format
-                for date_format in ('%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S'):
-                    try:
-                        dt_obj = datetime.strptime(submitted_date_str, date_format)
-                        event_time = int(dt_obj.timestamp())
-                        break
-                    except ValueError:
-                        continue
+                parsed_time = parse_submitted_date(submitted_date)
+                if parsed_time is not None:
+                    event_time = parsed_time
             except Exception as e:
                 logging.warning(f"Could not parse submitted date, using current time: {e}")
         
-        # Set event parameters - same for both sheet types
-        event_name = 'Purchase V2'
-        currency = 'INR'
-        event_value = 1.0
-        
         # Initialize user_data 
         user_data = {}
         
@@ -332,272 +558,478 @@ def send_to_facebook(row, row_index, column_map, config, sheet_type):
         if fbclid:
             user_data['fbc'] = fbclid
         
-        # Add email if available and not empty
-        if column_map.get('email') is not None and column_map.get('email') < len(row) and row[column_map['email']]:
-            email_val = row[column_map['email']]
-            hashed_email = hash_data(email_val)
-            logging.info(f"Hashing email: {email_val} -> {hashed_email}")
-            user_data['em'] = hashed_email
-        
-        # Add phone if available and not empty
-        if column_map.get('phone') is not None and column_map.get('phone') < len(row) and row[column_map['phone']]:
-            phone_val = row[column_map['phone']]
-            hashed_phone = hash_data(phone_val)
-            logging.info(f"Hashing phone: {phone_val} -> {hashed_phone}")
-            user_data['ph'] = hashed_phone
-        
-        # Handle name fields differently based on sheet type
-        if sheet_type == 'leads':
-            # Leads sheet has separate first_name and last_name
-            if column_map.get('first_name') is not None and column_map.get('first_name') < len(row) and row[column_map['first_name']]:
-                fname_val = row[column_map['first_name']]
+        # Add hashed email, phone and (for leads) first/last name if available and not empty
+        for fb_key, col_key, col in user_columns:
+            value = safe_cell(row, col)
+            if value:
+                hashed = hash_data(value)
+                logging.debug("Hashing %s: %s -> %s", col_key, value, hashed)
+                user_data[fb_key] = hashed
+        
+        full_name = safe_cell(row, name_col)
+        if full_name:
+            # Try to split the name if possible
+            name_parts = full_name.split(' ', 1)
+            if len(name_parts) >= 2:
+                fname_val = name_parts[0]
+                lname_val = name_parts[1]
                 hashed_fn = hash_data(fname_val)
-                logging.info(f"Hashing first name: {fname_val} -> {hashed_fn}")
-                user_data['fn'] = hashed_fn
-            
-            if column_map.get('last_name') is not None and column_map.get('last_name') < len(row) and row[column_map['last_name']]:
-                lname_val = row[column_map['last_name']]
                 hashed_ln = hash_data(lname_val)
-                logging.info(f"Hashing last name: {lname_val} -> {hashed_ln}")
+                logging.debug("Hashing first name from full name: %s -> %s", fname_val, hashed_fn)
+                logging.debug("Hashing last name from full name: %s -> %s", lname_val, hashed_ln)
+                user_data['fn'] = hashed_fn
                 user_data['ln'] = hashed_ln
-                
-        elif sheet_type == 'participants':
-            # Participants sheet has a single name field
-            if column_map.get('name') is not None and column_map.get('name') < len(row) and row[column_map['name']]:
-                full_name = row[column_map['name']]
-                # Try to split the name if possible
-                name_parts = full_name.split(' ', 1)
-                if len(name_parts) >= 2:
-                    fname_val = name_parts[0]
-                    lname_val = name_parts[1]
-                    hashed_fn = hash_data(fname_val)
-                    hashed_ln = hash_data(lname_val)
-                    logging.info(f"Hashing first name from full name: {fname_val} -> {hashed_fn}")
-                    logging.info(f"Hashing last name from full name: {lname_val} -> {hashed_ln}")
-                    user_data['fn'] = hashed_fn
-                    user_data['ln'] = hashed_ln
-                else:
-                    fname_val = full_name
-                    hashed_fn = hash_data(fname_val)
-                    logging.info(f"Hashing full name as first name: {fname_val} -> {hashed_fn}")
-                    user_data['fn'] = hashed_fn
+            else:
+                fname_val = full_name
+                hashed_fn = hash_data(fname_val)
+                logging.debug("Hashing full name as first name: %s -> %s", fname_val, hashed_fn)
+                user_data['fn'] = hashed_fn
         
         # Add IP address if available (do not hash as per FB docs)
-        if column_map.get('ip_address') is not None and column_map.get('ip_address') < len(row) and row[column_map['ip_address']]:
-            user_data['client_ip_address'] = row[column_map['ip_address']]
+        ip_address = safe_cell(row, ip_address_col)
+        if ip_address:
+            user_data['client_ip_address'] = ip_address
         
         # Initialize custom_data with basic values
         custom_data = {
-            'value': event_value,
-            'currency': currency,
+            'value': EVENT_VALUE,
+            'currency': EVENT_CURRENCY,
             'sheet_type': sheet_type  # Include sheet type as a custom parameter
         }
         
         # Add campaign parameters if available - with proper cleaning
-        for utm_param in ['utm_source', 'utm_medium', 'utm_campaign', 'utm_content', 'utm_term']:
-            if column_map.get(utm_param) is not None and column_map.get(utm_param) < len(row) and row[column_map[utm_param]]:
-                cleaned_value = clean_utm_value(row[column_map[utm_param]])
-                if cleaned_value:
-                    custom_data[utm_param] = cleaned_value
+        for utm_param, col in utm_columns:
+            cleaned_value = clean_utm_value(safe_cell(row, col))
+            if cleaned_value:
+                custom_data[utm_param] = cleaned_value
         
         # Create the complete event data structure
         event_data = {
-            'event_name': event_name,
+            'event_name': EVENT_NAME,
             'event_time': event_time,
+            'event_id': conversion_id(row, key_columns),
             'user_data': user_data,
             'custom_data': custom_data,
-            'action_source': 'website'
+            'action_source': EVENT_ACTION_SOURCE
         }
         
         # Add URL as event_source_url if available
-        if column_map.get('url') is not None and column_map.get('url') < len(row) and row[column_map['url']]:
-            event_data['event_source_url'] = row[column_map['url']]
+        url = safe_cell(row, url_col)
+        if url:
+            event_data['event_source_url'] = url
         
-        # Construct the API request
-        url = f"https://graph.facebook.com/{FB_API_VERSION}/{config['pixel_id']}/events"
+        return event_data
+    
+    return build_event
+
+# Event builders for every sheet type, specialized once at startup
+EVENT_BUILDERS = {sheet_type: make_event_builder(sheet_type, column_map) for sheet_type, column_map in COLUMN_MAPS.items()}
+
+# Build the per-sheet sending context
+def build_sheet_context(config, sheet_type, limiter):
+    """Resolve everything that is the same for every event of a sheet once, before its rows are sent"""
+    return {
+        'limiter': limiter,
+        'url': f"https://graph.facebook.com/{FB_API_VERSION}/{config['pixel_id']}/events",
+        'access_token': config['access_token'],
+        # Only sent in test mode
+        'test_event_code': config.get('test_event_code') if config['test_mode'] else None,
+        'column_map': get_column_map(sheet_type),
+        'build_event': EVENT_BUILDERS[sheet_type],
+        'sheet_type': sheet_type
+    }
+
+# Build the Conversion API request payload for several events
+def build_payload(ctx, events):
+    """Build the Facebook Conversion API request body carrying a list of events, encoded as compact JSON"""
+    payload = {
+        'data': events,
+        'access_token': ctx['access_token']
+    }
+    
+    # Add test_event_code if in test mode
+    if ctx['test_event_code'] is not None:
+        payload['test_event_code'] = ctx['test_event_code']
+    
+    body = json.dumps(payload, separators=JSON_SEPARATORS)
+    root_logger = logging.getLogger()
+    
+    # Log the complete payload only when debugging, to verify hashing
+    if root_logger.isEnabledFor(logging.DEBUG):
+        logging.debug(f"Full Facebook API payload (unredacted): {body}")
+    
+    # Log a redacted version for general logging; the secret fields are swapped out and
+    # restored afterwards instead of copying the payload
+    if root_logger.isEnabledFor(logging.INFO):
+        access_token = payload['access_token']
+        user_data_by_event = [event.get('user_data') for event in events]
+        try:
+            payload['access_token'] = '***REDACTED***'
+            for event, user_data in zip(events, user_data_by_event):
+                if user_data is not None:
+                    event['user_data'] = {
+                        k: ('***HASHED***' if k not in ['client_ip_address', 'client_user_agent', 'fbc', 'fbp'] else v)
+                        for k, v in user_data.items()
+                    }
+            logging.info(f"Redacted Facebook API payload: {json.dumps(payload)}")
+        finally:
+            payload['access_token'] = access_token
+            for event, user_data in zip(events, user_data_by_event):
+                if user_data is not None:
+                    event['user_data'] = user_data
+    
+    return body
+
+# Classify a failed Conversion API response
+def classify_api_error(status_code, result):
+    """Return 'transient' (retry later), 'auth' (stop sending) or 'invalid' (the events were rejected)"""
+    error = result.get('error') if isinstance(result, dict) else None
+    error = error if isinstance(error, dict) else {}
+    code = error.get('code')
+    
+    if status_code == 429 or status_code >= 500 or error.get('is_transient') or code in FB_THROTTLE_ERROR_CODES:
+        return 'transient'
+    if status_code in (401, 403) or code in FB_AUTH_ERROR_CODES or (code, error.get('error_subcode')) == FB_UNKNOWN_OBJECT_ERROR:
+        return 'auth'
+    if 400 <= status_code < 500:
+        return 'invalid'
+    return 'transient'
+
+# Post events to the Facebook Conversion API
+def post_to_facebook(session, ctx, events):
+    """POST events in one request over the shared session
+    
+    Returns (success, message, error_kind); error_kind is None on success, 'partial' if only
+    some of the events were received, else as classify_api_error.
+    """
+    body = build_payload(ctx, events)
+    
+    # Make the API request once the rate limiter allows it; the body is already encoded,
+    # so requests does not serialise the payload again
+    acquire_token(ctx['limiter'])
+    response = session.post(ctx['url'], data=body, headers=JSON_HEADERS)
+    adjust_rate_limiter(ctx['limiter'], response)
+    result = {}
+    
+    try:
+        if response.text:
+            result = response.json()
         
-        payload = {
-            'data': [event_data],
-            'access_token': config['access_token']
-        }
+        logging.info(f"Facebook API response status: {response.status_code}")
+        logging.info(f"Facebook API response body: {response.text}")
         
-        # Add test_event_code if in test mode
-        if config['test_mode'] and 'test_event_code' in config:
-            payload['test_event_code'] = config['test_event_code']
+        # Handle error responses
+        if response.status_code != 200:
+            error_message = f"API error {response.status_code}: {response.text}"
+            logging.error(error_message)
+            return False, error_message, classify_api_error(response.status_code, result)
         
-        # Log the complete payload for debugging to verify hashing
-        logging.info(f"Full Facebook API payload (unredacted): {json.dumps(payload)}")
+        # Check if all events were successfully received
+        if result.get('events_received', 0) >= len(events):
+            return True, "Success", None
+        else:
+            error_msg = json.dumps(result.get('messages', ['Unknown error']))
+            return False, f"API error: {result.get('events_received', 0)} of {len(events)} events received: {error_msg}", 'partial'
         
-        # Log a redacted version for general logging
-        debug_payload = payload.copy()
-        if 'data' in debug_payload and len(debug_payload['data']) > 0:
-            if 'user_data' in debug_payload['data'][0]:
-                debug_payload['data'][0]['user_data'] = {
-                    k: ('***HASHED***' if k not in ['client_ip_address', 'client_user_agent', 'fbc', 'fbp'] else v)
-                    for k, v in debug_payload['data'][0]['user_data'].items()
-                }
-        debug_payload['access_token'] = '***REDACTED***'
-        logging.info(f"Redacted Facebook API payload: {json.dumps(debug_payload)}")
+    except Exception as e:
+        logging.error(f"Error parsing API response: {e}")
+        if response.status_code != 200:
+            return False, f"API error {response.status_code}: {response.text}", classify_api_error(response.status_code, {})
+        return False, f"Error parsing response: {str(e)}", 'transient'
+
+# Send a batch of fbclids to Facebook Conversion API
+def send_batch_to_facebook(session, batch, ctx):
+    """Send the rows of a batch as one Conversion API request
+    
+    batch is a list of (row_index, row); returns one (success, message, error_kind) per row.
+    """
+    try:
+        build_event = ctx['build_event']
+        events = [build_event(row, row_index) for row_index, row in batch]
+        success, message, error_kind = post_to_facebook(session, ctx, events)
         
-        # Make the API request
-        response = requests.post(url, json=payload)
-        result = {}
+        # One invalid event makes the API reject the whole request, and a partial receipt does not
+        # say which events were dropped, so resend the events one at a time to find out which rows
+        # failed (events already received carry the same event_id and are deduplicated)
+        if error_kind in ('invalid', 'partial') and len(events) > 1:
+            logging.warning(f"Batch of {len(events)} events not fully accepted, resending them one at a time")
+            return [post_single_event(session, ctx, event) for event in events]
         
-        try:
-            if response.text:
-                result = response.json()
-            
-            logging.info(f"Facebook API response status: {response.status_code}")
-            logging.info(f"Facebook API response body: {response.text}")
-            
-            # Handle error responses
-            if response.status_code != 200:
-                error_message = f"API error {response.status_code}: {response.text}"
-                logging.error(error_message)
-                return False, error_message
-            
-            # Check if the event was successfully received
-            if 'events_received' in result and result['events_received'] > 0:
-                return True, "Success"
-            else:
-                error_msg = json.dumps(result.get('messages', ['Unknown error']))
-                return False, f"API error: {error_msg}"
-            
-        except Exception as e:
-            logging.error(f"Error parsing API response: {e}")
-            return False, f"Error parsing response: {str(e)}"
+        return [(success, message, error_kind)] * len(events)
         
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error sending to Facebook API: {e}")
-        return False, f"Request error: {str(e)}"
+        return [(False, f"Request error: {str(e)}", 'transient')] * len(batch)
         
     except Exception as e:
         logging.error(f"Error sending to Facebook API: {e}")
-        return False, f"Error: {str(e)}"
+        return [(False, f"Error: {str(e)}", 'transient')] * len(batch)
 
-# Update Google Sheet with results
-def update_sheet(service, sheet_id, sheet_name, column_map, updates):
-    """Update Google Sheet with results"""
-    if not updates:
-        logging.info(f"No updates to make to sheet {sheet_name}")
-        return
-    
+# Resend one event of a rejected batch
+def post_single_event(session, ctx, event):
+    """Post one event on its own; an exception fails only this event, as transient"""
     try:
-        logging.info(f"Updating {len(updates)} rows in sheet {sheet_name}")
+        return post_to_facebook(session, ctx, [event])
         
-        batch_update_values_request_body = {
-            'value_input_option': 'RAW',
-            'data': []
-        }
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Request error sending event {event.get('event_id')} to Facebook API: {e}")
+        return (False, f"Request error: {str(e)}", 'transient')
         
-        for row_index, sent_status, attempts, error_message in updates:
-            # Update fbclid_sent status
-            fbclid_sent_col = chr(65 + column_map['fbclid_sent'])
-            batch_update_values_request_body['data'].append({
-                'range': f"{sheet_name}!{fbclid_sent_col}{row_index}",
-                'values': [[sent_status]]
-            })
-            
-            # Update attempts count
-            attempts_col = chr(65 + column_map['attempts'])
-            batch_update_values_request_body['data'].append({
-                'range': f"{sheet_name}!{attempts_col}{row_index}",
-                'values': [[attempts]]
+    except Exception as e:
+        logging.error(f"Error sending event {event.get('event_id')} to Facebook API: {e}")
+        return (False, f"Error: {str(e)}", 'transient')
+
+# Convert a column index to A1 notation
+@functools.lru_cache(maxsize=None)
+def col_letter(col):
+    """Convert a 0-indexed column number to its A1 letters (0 -> A, 25 -> Z, 26 -> AA)"""
+    letters = ''
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+# Build the sheet update ranges for processed rows
+def build_sheet_updates(sheet_name, column_map, updates):
+    """Build the batchUpdate value ranges recording the results of one sheet's rows
+    
+    fbclid_sent, attempts and the error column (right after attempts) are adjacent,
+    so each row is written as one 3-cell range; an empty error clears an old one.
+    """
+    adjacent = column_map['attempts'] == column_map['fbclid_sent'] + 1
+    sent_col = col_letter(column_map['fbclid_sent'])
+    attempts_col = col_letter(column_map['attempts'])
+    error_col = col_letter(column_map['attempts'] + 1)
+    data = []
+    
+    for row_index, sent_status, attempts, error_message in updates:
+        if adjacent:
+            data.append({
+                'range': f"{sheet_name}!{sent_col}{row_index}:{error_col}{row_index}",
+                'values': [[sent_status, attempts, error_message]]
             })
-            
-            # Add error message to next column (if needed)
-            if error_message:
-                next_col = chr(65 + column_map['attempts'] + 1)
-                batch_update_values_request_body['data'].append({
-                    'range': f"{sheet_name}!{next_col}{row_index}",
-                    'values': [[error_message]]
-                })
-        
-        # Execute the batch update
-        result = service.spreadsheets().values().batchUpdate(
-            spreadsheetId=sheet_id,
-            body=batch_update_values_request_body
-        ).execute()
-        
-        logging.info(f"Sheet {sheet_name} updated successfully: {result}")
-        return len(updates)
+            continue
         
-    except Exception as e:
-        logging.error(f"Error updating Google Sheet {sheet_name}: {e}")
-        print(f"Error updating Google Sheet {sheet_name}: {e}")
+        # Columns not adjacent - update fbclid_sent status and attempts count separately
+        data.append({
+            'range': f"{sheet_name}!{sent_col}{row_index}",
+            'values': [[sent_status]]
+        })
+        data.append({
+            'range': f"{sheet_name}!{attempts_col}{row_index}:{error_col}{row_index}",
+            'values': [[attempts, error_message]]
+        })
+    
+    return data
+
+# Wait before retrying a failed sheet write
+def sheets_retry_delay(e, attempt):
+    """Seconds to wait before retrying a Sheets call, or None if the error is permanent
+    
+    Quota (429) and server errors usually carry Retry-After, which is used when present;
+    otherwise the wait doubles with each attempt.
+    """
+    if isinstance(e, HttpError):
+        status = getattr(e.resp, 'status', None)
+        if status not in SHEETS_RETRYABLE_STATUSES:
+            return None
+        retry_after = e.resp.get('retry-after')
+        if retry_after and str(retry_after).strip().isdigit():
+            return int(retry_after)
+    return min(MAX_BACKOFF_DELAY, 2 ** attempt) + random.uniform(0, 1)
+
+# Update Google Sheet with results
+def update_sheets(service, sheet_id, data):
+    """Write result ranges to Google Sheets in one batchUpdate, retrying quota, server and network errors"""
+    if not data:
+        logging.info("No updates to make to any sheet")
         return 0
+    
+    batch_update_values_request_body = {
+        'value_input_option': 'RAW',
+        'data': data
+    }
+    
+    for attempt in range(SHEETS_WRITE_RETRIES):
+        try:
+            logging.info(f"Updating {len(data)} ranges")
+            
+            # Execute the batch update
+            result = service.spreadsheets().values().batchUpdate(
+                spreadsheetId=sheet_id,
+                body=batch_update_values_request_body
+            ).execute()
+            
+            logging.info(f"Sheets updated successfully: {result.get('totalUpdatedCells', 0)} cells in {result.get('totalUpdatedSheets', 0)} sheets")
+            return len(data)
+            
+        except (HttpError, ConnectionError, TimeoutError) as e:
+            delay = sheets_retry_delay(e, attempt)
+            if delay is None or attempt == SHEETS_WRITE_RETRIES - 1:
+                error = e
+                break
+            logging.warning(f"Error updating Google Sheets on attempt {attempt + 1}, retrying in {delay:.1f} seconds: {e}")
+            time.sleep(delay)
+            
+        except Exception as e:
+            error = e
+            break
+    
+    # The results are lost from the sheet (sent fbclids are still in the ledger), so log them in full
+    logging.error(f"Error updating Google Sheets: {error}")
+    logging.error(f"Result ranges not written: {json.dumps(data)}")
+    print(f"Error updating Google Sheets: {error}")
+    return 0
+
+# Write result ranges in the background
+def submit_sheet_updates(sheet_writer, service, sheet_id, sheet_name, column_map, updates):
+    """Queue the results of some rows on the single sheet writer thread; returns the future, or None if there is nothing to write
+    
+    The writer is the only thread using the Sheets service while rows are being sent.
+    """
+    if not updates:
+        return None
+    return sheet_writer.submit(update_sheets, service, sheet_id, build_sheet_updates(sheet_name, column_map, updates))
 
 # Process a single sheet
-def process_sheet(service, config, sheet_config):
-    """Process a single sheet from the configuration"""
+def process_sheet(service, session, limiter, config, sheet_config, sheet_data, sent_ledger, sheet_writer):
+    """Process a single sheet from the configuration, given its (headers, data) as read
+    
+    Results are written to the sheet in the background every SHEETS_WRITE_INTERVAL seconds while
+    rows are still being sent, and once more at the end. Returns (processed, success, errors, sheet_write_futures).
+    """
     sheet_name = sheet_config['name']
     sheet_type = sheet_config['type']
     check_converted = sheet_config.get('check_converted', True)
     
     logging.info(f"Processing sheet: {sheet_name} (type: {sheet_type})")
     
-    # Get column mapping for this sheet type
-    column_map = get_column_map(sheet_type)
+    # Column mapping, URL and token for this sheet, resolved once for all of its rows
+    ctx = build_sheet_context(config, sheet_type, limiter)
+    column_map = ctx['column_map']
     
-    # Read data from sheet
-    headers, data = read_sheet_data(service, config, sheet_name)
+    headers, data = sheet_data
     
     if not data:
         logging.warning(f"No data found in sheet {sheet_name}")
         print(f"No data found in sheet {sheet_name}")
-        return 0, 0, 0
+        return 0, 0, 0, []
+    
+    sheet_id = config['sheet_id']
+    attempts_i = column_map['attempts']
+    key_columns = conversion_key_columns(column_map)
+    write_futures = []
     
     # Filter rows that need to be processed
     rows_to_process = filter_rows_to_process(data, column_map, check_converted)
     
+    # Conversions already sent by an earlier run whose sheet update did not land are not sent
+    # again; the sheet is just marked as sent. The ledger only keeps conversions whose row is
+    # not marked 'Y' yet, so entries drop out once the sheet has caught up.
+    updates = []
+    ledger_key = f"{sheet_id}:{sheet_name}"
+    previously_sent = sent_ledger.get(ledger_key, set())
+    sent_ids = set()
+    sent_ledger[ledger_key] = sent_ids
+    if previously_sent:
+        remaining_rows = []
+        for row_index, row in rows_to_process:
+            row_conversion_id = conversion_id(row, key_columns)
+            if row_conversion_id in previously_sent:
+                sent_ids.add(row_conversion_id)
+                updates.append((row_index, 'Y', row[attempts_i] or 0, ""))
+            else:
+                remaining_rows.append((row_index, row))
+        if updates:
+            logging.info(f"Skipping {len(updates)} rows already in the local sent ledger")
+        rows_to_process = remaining_rows
+    
     if not rows_to_process:
         logging.info(f"No rows need fbclid to be sent in sheet {sheet_name}")
         print(f"No rows need fbclid to be sent in sheet {sheet_name}")
-        return 0, 0, 0
+        write_futures.append(submit_sheet_updates(sheet_writer, service, sheet_id, sheet_name, column_map, updates))
+        return 0, 0, 0, [future for future in write_futures if future is not None]
     
     # Process each row
-    updates = []
     processed_count = 0
     success_count = 0
     error_count = 0
+    backoff_rounds = 0  # Consecutive rounds that hit throttling or server errors
+    last_write = time.monotonic()
     
-    for i, (row_index, row) in enumerate(rows_to_process):
-        try:
-            # Get current attempts value
-            current_attempts = int(row[column_map['attempts']]) if row[column_map['attempts']] else 0
-            new_attempts = current_attempts + 1
-            
-            # Send to Facebook
-            success, message = send_to_facebook(row, row_index, column_map, config, sheet_type)
+    # Each request carries BATCH_SIZE events; CONCURRENT_REQUESTS of them are sent at once
+    batches = [rows_to_process[i:i + BATCH_SIZE] for i in range(0, len(rows_to_process), BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=CONCURRENT_REQUESTS) as executor:
+        for round_start in range(0, len(batches), CONCURRENT_REQUESTS):
+            round_batches = batches[round_start:round_start + CONCURRENT_REQUESTS]
+            futures = [
+                executor.submit(send_batch_to_facebook, session, batch, ctx)
+                for batch in round_batches
+            ]
             
-            # Prepare update data
-            if success:
-                updates.append((row_index, 'Y', new_attempts, ""))
-                success_count += 1
-                logging.info(f"Successfully sent fbclid for row {row_index}")
-            else:
-                updates.append((row_index, 'N', new_attempts, message))
-                error_count += 1
-                logging.warning(f"Failed to send fbclid for row {row_index}: {message}")
+            auth_failed = False
+            transient_failed = False
+            for batch, future in zip(round_batches, futures):
+                for (row_index, row), (success, message, error_kind) in zip(batch, future.result()):
+                    # A bad token or missing permission is not the row's fault, so no attempt is spent
+                    if error_kind == 'auth':
+                        auth_failed = True
+                        error_count += 1
+                        processed_count += 1
+                        logging.error(f"Not recording a failed attempt for row {row_index}: {message}")
+                        continue
+                    
+                    try:
+                        # Get current attempts value
+                        current_attempts = int(row[attempts_i]) if row[attempts_i] else 0
+                    except ValueError:
+                        current_attempts = 0
+                    new_attempts = current_attempts + 1
+                    
+                    # Prepare update data
+                    if success:
+                        updates.append((row_index, 'Y', new_attempts, ""))
+                        sent_ids.add(conversion_id(row, key_columns))
+                        success_count += 1
+                        logging.info(f"Successfully sent fbclid for row {row_index}")
+                    elif error_kind == 'invalid':
+                        # Retrying cannot help, so the row is marked and skipped by later runs
+                        updates.append((row_index, FBCLID_REJECTED, new_attempts, message))
+                        error_count += 1
+                        logging.warning(f"Facebook rejected fbclid for row {row_index}, not retrying: {message}")
+                    else:
+                        transient_failed = True
+                        updates.append((row_index, 'N', new_attempts, message))
+                        error_count += 1
+                        logging.warning(f"Failed to send fbclid for row {row_index}: {message}")
+                    
+                    processed_count += 1
             
-            processed_count += 1
+            # Write the results gathered so far while the next rounds are sent
+            if time.monotonic() - last_write >= SHEETS_WRITE_INTERVAL:
+                write_futures.append(submit_sheet_updates(sheet_writer, service, sheet_id, sheet_name, column_map, updates))
+                updates = []
+                last_write = time.monotonic()
             
-            # Respect rate limits with a delay between batches
-            if (i + 1) % BATCH_SIZE == 0:
-                logging.info(f"Processed {i + 1} rows, waiting {RATE_LIMIT_DELAY} seconds...")
-                time.sleep(RATE_LIMIT_DELAY)
+            if auth_failed:
+                logging.error(f"Facebook rejected the access token or pixel permissions, stopping sheet {sheet_name}")
+                print(f"Facebook rejected the access token or pixel permissions, stopping sheet {sheet_name}")
+                break
             
-        except Exception as e:
-            logging.error(f"Error processing row {row_index}: {e}")
-            # Still update the attempts count
-            updates.append((row_index, 'N', new_attempts, f"Error: {str(e)}"))
-            error_count += 1
+            # The rate limiter paces requests; only back off exponentially (with jitter)
+            # while Facebook throttles or fails
+            backoff_rounds = backoff_rounds + 1 if transient_failed else 0
+            if backoff_rounds and round_start + CONCURRENT_REQUESTS < len(batches):
+                delay = min(MAX_BACKOFF_DELAY, RATE_LIMIT_DELAY * 2 ** backoff_rounds) + random.uniform(0, 1)
+                logging.info(f"Processed {processed_count} rows, backing off {delay:.1f} seconds...")
+                time.sleep(delay)
     
-    # Update the sheet with results
-    update_sheet(service, config['sheet_id'], sheet_name, column_map, updates)
+    # Write the remaining results
+    write_futures.append(submit_sheet_updates(sheet_writer, service, sheet_id, sheet_name, column_map, updates))
     
-    # Return counts
-    return processed_count, success_count, error_count
+    # Return counts and the pending sheet writes, waited for by main()
+    return processed_count, success_count, error_count, [future for future in write_futures if future is not None]
 
 # Main function
 def main():
@@ -609,29 +1041,54 @@ def main():
         # Set up Google Sheets API
         service = setup_google_sheets()
         
+        # One HTTP session (keep-alive connection pool) for all Facebook API calls
+        session = create_http_session()
+        limiter = create_rate_limiter()
+        
         # Track overall statistics
         total_processed = 0
         total_success = 0
         total_errors = 0
         
-        # Process each sheet in the configuration
-        for sheet_config in config['sheets']:
-            sheet_name = sheet_config['name']
-            sheet_type = sheet_config['type']
-            
-            logging.info(f"Starting to process sheet: {sheet_name} (type: {sheet_type})")
-            
-            # Process the sheet
-            processed, success, errors = process_sheet(service, config, sheet_config)
-            
-            # Update totals
-            total_processed += processed
-            total_success += success
-            total_errors += errors
+        # Read all sheets up front in one request
+        sheets_data = read_all_sheets(service, config)
+        
+        # Conversions sent by earlier runs, per sheet
+        sent_ledger = load_sent_ledger()
+        
+        # Recorded once at the end, also when a sheet fails part-way, so the conversions sent
+        # so far are not sent again if their sheet update did not land
+        try:
+            # Sheet writes run on one background thread, overlapping with the Facebook requests
+            with ThreadPoolExecutor(max_workers=1) as sheet_writer:
+                write_futures = []
+                
+                # Process each sheet in the configuration
+                for sheet_config in config['sheets']:
+                    sheet_name = sheet_config['name']
+                    sheet_type = sheet_config['type']
+                    
+                    logging.info(f"Starting to process sheet: {sheet_name} (type: {sheet_type})")
+                    
+                    # Process the sheet
+                    processed, success, errors, sheet_futures = process_sheet(service, session, limiter, config, sheet_config, sheets_data[sheet_name], sent_ledger, sheet_writer)
+                    write_futures.extend(sheet_futures)
+                    
+                    # Update totals
+                    total_processed += processed
+                    total_success += success
+                    total_errors += errors
+                    
+                    # Log sheet results
+                    logging.info(f"Sheet {sheet_name} processing complete: {processed} rows processed, {success} successful, {errors} errors")
+                    print(f"Sheet {sheet_name} processing complete:\n - {processed} rows processed\n - {success} successful\n - {errors} errors\n")
+                
+                # Wait for the remaining sheet writes
+                updated_ranges = sum(future.result() for future in write_futures)
+                logging.info(f"Wrote {updated_ranges} result ranges to the sheets")
             
-            # Log sheet results
-            logging.info(f"Sheet {sheet_name} processing complete: {processed} rows processed, {success} successful, {errors} errors")
-            print(f"Sheet {sheet_name} processing complete:\n - {processed} rows processed\n - {success} successful\n - {errors} errors\n")
+        finally:
+            save_sent_ledger(sent_ledger)
         
         # Print overall summary
         logging.info(f"All sheets processing complete: {total_processed} total rows processed, {total_success} total successful, {total_errors} total errors")
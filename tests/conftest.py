@@ -0,0 +1,47 @@
+"""Load the two scripts as modules for the tests"""
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Load a script by path (campaign-tracker-v2.py is not an importable module name)
+def load_script(module_name, filename):
+    spec = importlib.util.spec_from_file_location(module_name, ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(scope='session')
+def tracker():
+    """campaign-tracker-v2.py, loaded against a minimal config_campaign.
+
+    The real config holds database and Sheets credentials, so the tests never import it.
+    """
+    for dependency in ('mysql.connector', 'httplib2', 'googleapiclient', 'google_auth_oauthlib'):
+        pytest.importorskip(dependency)
+    
+    config = types.ModuleType('config_campaign')
+    config.sheet_ids = {'test': 'spreadsheet'}
+    config.merge_sheet = {'test': {'merge_success': 'Merged Success'}}
+    config.get_sheet_name = lambda campaign, sheet_type: sheet_type
+    
+    saved = sys.modules.get('config_campaign')
+    sys.modules['config_campaign'] = config
+    try:
+        return load_script('campaign_tracker_v2', 'campaign-tracker-v2.py')
+    finally:
+        if saved is None:
+            sys.modules.pop('config_campaign', None)
+        else:
+            sys.modules['config_campaign'] = saved
+
+@pytest.fixture(scope='session')
+def fb():
+    """fbclid_update_fb.py"""
+    for dependency in ('requests', 'urllib3', 'googleapiclient', 'google_auth_oauthlib'):
+        pytest.importorskip(dependency)
+    return load_script('fbclid_update_fb', 'fbclid_update_fb.py')
@@ -0,0 +1,151 @@
+"""Tests for campaign-tracker-v2.py helpers and its Sheets failure paths"""
+import json
+import types
+
+import httplib2
+import pytest
+
+SPREADSHEET_ID = 'spreadsheet'
+
+# Build a Sheets API error as the client raises it
+def http_error(tracker, status, message):
+    resp = httplib2.Response({'status': status})
+    content = json.dumps({'error': {'code': status, 'message': message}}).encode('utf-8')
+    return tracker.HttpError(resp, content)
+
+# Just enough of the Sheets client for reads, value writes and addSheet
+class FakeSheets:
+    def __init__(self, read, write=None):
+        self.read = read  # read(ranges) -> list of row lists, or raises
+        self.write = write or (lambda data: None)  # write(data) raises to fail a value write
+        self.written = []
+        self.added_sheets = []
+    
+    def spreadsheets(self):
+        return self
+    
+    def values(self):
+        return self
+    
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        return types.SimpleNamespace(execute=lambda: {'valueRanges': [{'values': rows} for rows in self.read(ranges)]})
+    
+    def batchUpdate(self, spreadsheetId, body):
+        if 'requests' in body:
+            return types.SimpleNamespace(execute=lambda: self.added_sheets.extend(
+                request['addSheet']['properties']['title'] for request in body['requests']))
+        return types.SimpleNamespace(execute=lambda: self._write(body['data']))
+    
+    def _write(self, data):
+        self.write(data)
+        self.written.extend((item['range'], item['values']) for item in data)
+        return {'totalUpdatedCells': sum(cell is not None for item in data for row in item['values'] for cell in row)}
+
+@pytest.fixture
+def sheets_state(tracker, monkeypatch, tmp_path):
+    """Clean per-run state, no retry sleeps or sampled verification, files in a temp directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tracker, 'backoff_sleep', lambda *args, **kwargs: 0)
+    monkeypatch.setattr(tracker, 'VERIFY_SAMPLE_RATE', 0)
+    tracker._sheet_row_counts.clear()
+    tracker._backed_up_sheet_types.clear()
+    yield tracker
+    tracker._sheet_row_counts.clear()
+    tracker._backed_up_sheet_types.clear()
+
+@pytest.mark.parametrize('value, expected', [
+    ('123', 123),
+    ('123.0', 123),
+    (456, 456),
+    ('Ref', None),
+    ('', None),
+])
+def test_parse_sheet_id(tracker, value, expected):
+    assert tracker.parse_sheet_id(value) == expected
+
+def test_split_payloads_keeps_order_and_start_rows(tracker):
+    payloads = [('A', 2, [[1], [2], [3]]), ('B', 10, [[4]])]
+    assert tracker.split_payloads(payloads, 2) == [
+        [('A', 2, [[1], [2]])],
+        [('A', 4, [[3]]), ('B', 10, [[4]])],
+    ]
+
+def test_split_payloads_single_chunk(tracker):
+    payloads = [('A', 2, [[1]]), ('B', 5, [[2]])]
+    assert tracker.split_payloads(payloads, 10) == [payloads]
+
+def test_extract_utm_parameters(tracker):
+    params = tracker.extract_utm_parameters(
+        'https://example.com/courses/python/?utm_source=fb&utm_campaign=spring+sale&utm_source=other&fbclid=abc%3D',
+        'google.com')
+    assert params['first_page'] == 'courses/python'
+    assert params['utm_source'] == 'fb'  # first value wins
+    assert params['utm_campaign'] == 'spring sale'
+    assert params['fbclid'] == 'abc='
+    assert params['greferrer'] == 'google.com'
+
+def test_extract_utm_parameters_without_url(tracker):
+    params = tracker.extract_utm_parameters('', '')
+    assert set(params.values()) == {''}
+
+def test_merge_skipped_when_read_fails(sheets_state):
+    tracker = sheets_state
+    
+    def read(ranges):
+        raise http_error(tracker, 500, 'Internal error encountered.')
+    sheets = FakeSheets(read)
+    
+    assert tracker.merge_sheets(sheets, SPREADSHEET_ID, 'test') == 0
+    assert sheets.added_sheets == []
+    assert sheets.written == []
+
+def test_merge_creates_missing_merge_sheet(sheets_state):
+    tracker = sheets_state
+    source = {
+        'course_success': [['Ref', 'Name'], ['1', 'a']],
+        'ad_success': [['Ref', 'Name'], ['2', 'b']],
+    }
+    
+    def read(ranges):
+        for range_name in ranges:
+            if range_name.startswith('Merged Success!'):
+                raise http_error(tracker, 400, f"Unable to parse range: {range_name}")
+        return [source[range_name.split('!')[0]] for range_name in ranges]
+    sheets = FakeSheets(read)
+    
+    assert tracker.merge_sheets(sheets, SPREADSHEET_ID, 'test') == 2
+    assert sheets.added_sheets == ['Merged Success']
+    assert sheets.written == [
+        ('Merged Success!A1', [['Ref', 'Name']]),
+        ('Merged Success!A2', [[1, 'a'], [2, 'b']]),
+    ]
+
+def test_partial_write_counts_written_rows(sheets_state, monkeypatch):
+    tracker = sheets_state
+    monkeypatch.setattr(tracker, 'SHEETS_MAX_ROWS_PER_REQUEST', 1)
+    tracker._sheet_row_counts[(SPREADSHEET_ID, 'course_success')] = 1  # Header only
+    
+    def write(data):
+        if data[0]['range'] != 'course_success!A2':
+            raise http_error(tracker, 400, 'Invalid values')
+    sheets = FakeSheets(lambda ranges: [[] for _ in ranges], write)
+    
+    pending = [('course_success', 'course_success', [[1, 'a'], [2, 'b']])]
+    assert tracker.append_to_sheets(sheets, SPREADSHEET_ID, pending, 'test', 'live') == 2
+    
+    assert sheets.written == [('course_success!A2', [[1, 'a']])]
+    assert tracker.get_next_sheet_row(SPREADSHEET_ID, 'course_success') == 3
+    assert tracker.load_local_counters()['course_success_count'] == 1
+
+def test_write_moves_below_rows_added_since_read(sheets_state):
+    tracker = sheets_state
+    tracker._sheet_row_counts[(SPREADSHEET_ID, 'course_success')] = 3
+    
+    def read(ranges):
+        assert ranges == ['course_success!A4:T']
+        return [[['7', 'added by hand']]]
+    sheets = FakeSheets(read)
+    
+    pending = [('course_success', 'course_success', [[8, 'b']])]
+    assert tracker.append_to_sheets(sheets, SPREADSHEET_ID, pending, 'test', 'live') == 2
+    assert sheets.written == [('course_success!A5', [[8, 'b']])]
@@ -0,0 +1,95 @@
+"""Tests for fbclid_update_fb.py helpers"""
+import pytest
+
+# A participants row with the given cells set (everything else empty)
+def participants_row(fb, **cells):
+    column_map = fb.COLUMN_MAPS['participants']
+    row = [''] * (max(column_map.values()) + 1)
+    for key, value in cells.items():
+        row[column_map[key]] = value
+    return row
+
+@pytest.mark.parametrize('col, letters', [(0, 'A'), (25, 'Z'), (26, 'AA'), (51, 'AZ'), (52, 'BA'), (701, 'ZZ'), (702, 'AAA')])
+def test_col_letter(fb, col, letters):
+    assert fb.col_letter(col) == letters
+
+def test_filter_rows_to_process(fb):
+    column_map = fb.COLUMN_MAPS['participants']
+    data = [
+        participants_row(fb, fbclid='a'),
+        participants_row(fb, fbclid=''),
+        participants_row(fb, fbclid='b', fbclid_sent='Y'),
+        participants_row(fb, fbclid='c', fbclid_sent='X'),
+        participants_row(fb, fbclid='d', attempts=str(fb.MAX_ATTEMPTS)),
+        participants_row(fb, fbclid='e', attempts='two'),  # Non-numeric attempts count as 0
+        ['', '', '', '', 'short row'],
+    ]
+    rows = fb.filter_rows_to_process(data, column_map, check_converted=False)
+    assert [row_index for row_index, _ in rows] == [2, 7]
+
+def test_filter_rows_to_process_pads_short_rows(fb):
+    column_map = fb.COLUMN_MAPS['participants']
+    row = participants_row(fb, fbclid='a')[:column_map['fbclid'] + 1]
+    (row_index, padded), = fb.filter_rows_to_process([row], column_map, check_converted=False)
+    assert row_index == 2
+    assert len(padded) > max(column_map.values())
+    assert len(row) == column_map['fbclid'] + 1  # The sheet data is left as read
+
+def test_filter_rows_to_process_checks_converted(fb):
+    column_map = fb.COLUMN_MAPS['leads']
+    data = [[''] * (max(column_map.values()) + 1) for _ in range(2)]
+    for row in data:
+        row[column_map['fbclid']] = 'a'
+    data[0][column_map['converted']] = 'Y'
+    rows = fb.filter_rows_to_process(data, column_map)
+    assert [row_index for row_index, _ in rows] == [2]
+
+def test_build_sheet_updates_adjacent_columns(fb):
+    column_map = {'fbclid_sent': 22, 'attempts': 23}
+    assert fb.build_sheet_updates('Sheet', column_map, [(5, 'Y', 1, '')]) == [
+        {'range': 'Sheet!W5:Y5', 'values': [['Y', 1, '']]},
+    ]
+
+def test_build_sheet_updates_separate_columns(fb):
+    column_map = {'fbclid_sent': 35, 'attempts': 37}
+    assert fb.build_sheet_updates('Sheet', column_map, [(3, 'N', 2, 'error')]) == [
+        {'range': 'Sheet!AJ3', 'values': [['N']]},
+        {'range': 'Sheet!AL3:AM3', 'values': [[2, 'error']]},
+    ]
+
+@pytest.mark.parametrize('status_code, result, kind', [
+    (500, {}, 'transient'),
+    (429, {}, 'transient'),
+    (400, {'error': {'code': 4}}, 'transient'),
+    (400, {'error': {'code': 1, 'is_transient': True}}, 'transient'),
+    (400, {'error': {'code': 190}}, 'auth'),
+    (403, {}, 'auth'),
+    (400, {'error': {'code': 100, 'error_subcode': 33}}, 'auth'),
+    (400, {'error': {'code': 100, 'error_subcode': 2804003}}, 'invalid'),
+    (400, 'not json', 'invalid'),
+])
+def test_classify_api_error(fb, status_code, result, kind):
+    assert fb.classify_api_error(status_code, result) == kind
+
+def test_conversion_id_is_stable_and_keyed(fb):
+    key_columns = fb.conversion_key_columns(fb.COLUMN_MAPS['participants'])
+    row = participants_row(fb, fbclid='a', submitted_date='2025-01-01 10:00:00', email='x@example.com')
+    same = participants_row(fb, fbclid='a', submitted_date='2025-01-01 10:00:00', email='x@example.com', name='Other')
+    resubmitted = participants_row(fb, fbclid='a', submitted_date='2025-01-02 10:00:00', email='x@example.com')
+    
+    assert fb.conversion_id(row, key_columns) == fb.conversion_id(same, key_columns)
+    assert fb.conversion_id(row, key_columns) != fb.conversion_id(resubmitted, key_columns)
+    assert len(fb.conversion_id(row, key_columns)) == 32
+
+def test_resend_failure_only_fails_its_own_event(fb, monkeypatch):
+    def post(session, ctx, events):
+        if len(events) > 1:
+            return False, 'rejected', 'invalid'
+        if events[0]['event_id'] == 'b':
+            raise ValueError('boom')
+        return True, 'Success', None
+    monkeypatch.setattr(fb, 'post_to_facebook', post)
+    
+    ctx = {'build_event': lambda row, row_index: {'event_id': row}}
+    results = fb.send_batch_to_facebook(None, [(2, 'a'), (3, 'b'), (4, 'c')], ctx)
+    assert [kind for _, _, kind in results] == [None, 'transient', None]